@@ -0,0 +1,105 @@
+'''
+Solve a whole directory (or glob) of .bff files at once, spread over
+several processes, and stream one JSON line per puzzle.
+
+    python BatchLAZOR.py bff_files --jobs 8 --timeout 60 > results.jsonl
+'''
+
+import argparse
+import glob
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from SolveLAZOR import (ENGINES, INCOMPLETE_ENGINES, positive_int,
+                        solve_puzzle)
+
+
+def find_bff(pattern):
+    '''
+    Return the .bff files for a directory or a glob pattern.
+
+    **Parameters**
+        pattern: *string
+            A directory, whose .bff files are all used, or a glob
+            pattern such as 'bff_files/mad_*.bff'.
+
+    **Returns**
+        files: *list
+            The matching files, sorted by name.
+    '''
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, '*.bff')
+    return sorted(glob.glob(pattern))
+
+
+def solve_batch(pattern, jobs=None, timeout=None, engine='backtrack',
+                cache=None):
+    '''
+    Solve every puzzle matching pattern, jobs puzzles at a time.
+
+    **Parameters**
+        pattern: *string
+            A directory or glob pattern, see find_bff.
+        jobs: *int, optional
+            Number of worker processes, all cores by default.
+        timeout: *float, optional
+            Seconds each puzzle may take before it is given up.
+        engine: *string
+            The search engine to use, one of ENGINES.
+        cache: *string, optional
+            File name of a SolutionCache shared by the workers.
+
+    **Returns**
+        results: *generator
+            Yields the result of solve_puzzle for each puzzle as soon as
+            it is finished, so not necessarily in file order. A puzzle
+            on which solve_puzzle raised gets an 'error' result with the
+            exception, and no time.
+    '''
+    files = find_bff(pattern)
+    with ProcessPoolExecutor(jobs) as pool:
+        futures = {pool.submit(solve_puzzle, bfffile, engine, timeout,
+                               cache=cache): bfffile
+                   for bfffile in files}
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                # one puzzle that breaks the solver must not end the run
+                yield {'file': futures[future], 'status': 'error',
+                       'solution': None, 'cached': False,
+                       'error': '%s: %s' % (type(e).__name__, e),
+                       'time': None, 'candidates': 0}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Solve every .bff file in a directory or glob and '
+                    'write one JSON line per puzzle.')
+    parser.add_argument('pattern', help='directory or glob of .bff files')
+    parser.add_argument('--jobs', type=positive_int, default=None,
+                        help='worker processes (default: all cores)')
+    parser.add_argument('--timeout', type=float, default=None,
+                        help='seconds allowed per puzzle')
+    parser.add_argument('--engine', choices=sorted(ENGINES),
+                        default='backtrack', help='search engine')
+    parser.add_argument('--cache', default=None,
+                        help='SQLite file to look solutions up in and '
+                             'store them to')
+    args = parser.parse_args(argv)
+    if args.engine in INCOMPLETE_ENGINES and args.timeout is None:
+        parser.error('--engine %s needs --timeout' % args.engine)
+    failed = 0
+    for result in solve_batch(args.pattern, args.jobs, args.timeout,
+                              args.engine, args.cache):
+        if result['status'] != 'solved':
+            failed += 1
+        sys.stdout.write(json.dumps(result) + '\n')
+        sys.stdout.flush()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,305 @@
+'''
+Benchmarks for the LAZOR solver.
+
+Every puzzle in bff_files/ is solved for several rounds and the median
+and 95th percentile solve times, the candidates checked per second and
+the peak memory are recorded. The results can be saved as a baseline
+and later runs fail when a puzzle got slower than the baseline by more
+than a threshold:
+
+    python BenchLAZOR.py --write-baseline
+    python BenchLAZOR.py --threshold 1.5
+
+The stages of the solver (ReadInbff, define_grid, path_loop and
+grid_outcome) are timed on their own with --micro, so a regression can
+be traced to the stage it came from.
+
+With --scaling, puzzles from GenerateLAZOR are solved on boards of the
+given sizes instead, giving the solve time against the board size:
+
+    python BenchLAZOR.py --scaling 4 6 8 10 12 --count 5
+'''
+
+import argparse
+import glob
+import json
+import os
+import statistics
+import sys
+import time
+import timeit
+import tracemalloc
+
+from SolveLAZOR import (ENGINES, SolveStats, ReadInbff, define_grid,
+                        path_loop, grid_outcome, Reachability, Outcome)
+from GenerateLAZOR import generate_puzzle
+
+
+def percentile(values, pct):
+    '''
+    Return the pct percentile of values, by the nearest rank.
+    '''
+    values = sorted(values)
+    rank = max(1, -(-len(values) * pct // 100))
+    return values[int(rank) - 1]
+
+
+def bench_puzzle(bfffile, rounds=5, engine='backtrack'):
+    '''
+    Solve one puzzle several times and time it.
+
+    **Parameters**
+        bfffile: *string
+            The name of the directory of the desired bfffile.
+        rounds: *int
+            How many times to solve the puzzle.
+        engine: *string
+            The search engine to use, one of ENGINES.
+
+    **Returns**
+        result: *dict
+            median and p95 solve time in seconds, candidates checked per
+            solve, candidates per second, candidates rejected per
+            microsecond, the peak memory in KiB and how many times fewer
+            boards the reachability analysis left to try.
+    '''
+    puzzle = ReadInbff(bfffile)
+    times = []
+    for n in range(rounds):
+        stats = SolveStats()
+        start = time.perf_counter()
+        next(ENGINES[engine](*puzzle, stats=stats), None)
+        times.append(time.perf_counter() - start)
+    # One more solve under tracemalloc, which is too slow to time.
+    tracemalloc.start()
+    next(ENGINES[engine](*puzzle), None)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    median = statistics.median(times)
+    return {'median': median,
+            'p95': percentile(times, 95),
+            'candidates': stats.candidates,
+            'candidates_per_s': stats.candidates / median if median else 0,
+            'rejected_per_us': stats.rejected / (median * 1e6)
+            if median else 0,
+            'peak_kib': peak / 1024,
+            'shrink': Reachability(*puzzle).shrink}
+
+
+def bench_micro(bfffile, engine='backtrack'):
+    '''
+    Time each stage of the solver on one puzzle.
+
+    **Returns**
+        result: *dict
+            Microseconds per call of ReadInbff, define_grid, path_loop,
+            grid_outcome and Outcome. path_loop and grid_outcome run on
+            the solved board, or on the empty one if there is no
+            solution. Outcome runs on the empty board, to time how fast
+            a board that fails is rejected.
+    '''
+    P, A, B, C, L, Grid = ReadInbff(bfffile)
+    solved = next(ENGINES[engine](P, A, B, C, L, Grid), None) or Grid
+    board = define_grid(solved)
+    empty = define_grid(Grid)
+    outcome = Outcome(P, A, B, C, L, Grid)
+    stages = {
+        'ReadInbff': lambda: ReadInbff(bfffile),
+        'define_grid': lambda: define_grid(solved),
+        'path_loop': lambda: path_loop([L[0]], board),
+        'grid_outcome': lambda: grid_outcome(P, L, board),
+        'Outcome': lambda: outcome(empty),
+    }
+    result = {}
+    for name, stage in stages.items():
+        timer = timeit.Timer(stage)
+        number = timer.autorange()[0]
+        best = min(timer.repeat(repeat=3, number=number))
+        result[name] = best / number * 1e6
+    return result
+
+
+def bench_scaling(sizes, count=3, engine='backtrack', timeout=60.0,
+                  seed=0, **params):
+    '''
+    Solve generated puzzles of growing size and time them.
+
+    **Parameters**
+        sizes: *list
+            Board sizes; a size n means an n x n board.
+        count: *int
+            Puzzles solved per size, made with the seeds seed to
+            seed + count - 1.
+        engine: *string
+            The search engine to use, one of ENGINES.
+        timeout: *float, optional
+            Seconds a solve may take before it is given up.
+        params:
+            Passed on to generate_puzzle. By default every puzzle has
+            3 A blocks, 1 B block, 1 C block, 2 lasers and 4 points.
+
+    **Returns**
+        result: *dict
+            For each size (as a string, so the result can be saved as
+            JSON), the median and the slowest solve time in seconds,
+            the median number of candidates checked and the number of
+            solves that timed out.
+    '''
+    params = dict({'A': 3, 'B': 1, 'C': 1, 'lasers': 2, 'targets': 4},
+                  **params)
+    result = {}
+    for size in sizes:
+        times = []
+        candidates = []
+        timeouts = 0
+        for n in range(seed, seed + count):
+            puzzle, solution = generate_puzzle(size, size, seed=n, **params)
+            stats = SolveStats()
+            start = time.perf_counter()
+            stop = None
+            if timeout is not None:
+                deadline = start + timeout
+
+                def stop():
+                    return time.perf_counter() > deadline
+            if next(ENGINES[engine](*puzzle, stop=stop, stats=stats),
+                    None) is None:
+                timeouts += 1
+            times.append(time.perf_counter() - start)
+            candidates.append(stats.candidates)
+        result[str(size)] = {'median': statistics.median(times),
+                             'max': max(times),
+                             'candidates': statistics.median(candidates),
+                             'timeouts': timeouts}
+    return result
+
+
+def compare(results, baseline, threshold=1.5, min_time=0.005):
+    '''
+    Find the puzzles and stages that got slower than the baseline.
+
+    **Parameters**
+        results: *dict
+            The output of run.
+        baseline: *dict
+            An earlier output of run.
+        threshold: *float
+            How many times slower than the baseline is a regression.
+        min_time: *float
+            Solve times (in seconds) below this are too noisy to count
+            and are treated as min_time.
+
+    **Returns**
+        regressions: *list
+            (name, metric, baseline value, new value) of every regression.
+    '''
+    regressions = []
+    for name, new in results.get('puzzles', {}).items():
+        old = baseline.get('puzzles', {}).get(name)
+        if old is None:
+            continue
+        for metric in ('median', 'p95'):
+            if max(new[metric], min_time) > \
+                    threshold * max(old[metric], min_time):
+                regressions.append((name, metric, old[metric], new[metric]))
+    for size, new in results.get('scaling', {}).items():
+        old = baseline.get('scaling', {}).get(size)
+        if old is not None and max(new['median'], min_time) > \
+                threshold * max(old['median'], min_time):
+            regressions.append(('%sx%s' % (size, size), 'median',
+                                old['median'], new['median']))
+    for name, new in results.get('micro', {}).items():
+        old = baseline.get('micro', {}).get(name, {})
+        for stage, value in new.items():
+            if stage in old and value > threshold * old[stage]:
+                regressions.append((name, stage, old[stage], value))
+    return regressions
+
+
+def run(files, rounds=5, engine='backtrack', micro=False):
+    '''
+    Benchmark every file, returning a dictionary that can be saved as
+    a baseline.
+    '''
+    results = {'engine': engine, 'rounds': rounds, 'puzzles': {}}
+    for bfffile in files:
+        name = os.path.basename(bfffile)
+        if micro:
+            results.setdefault('micro', {})[name] = bench_micro(bfffile,
+                                                                engine)
+        else:
+            results['puzzles'][name] = bench_puzzle(bfffile, rounds, engine)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the solver.')
+    parser.add_argument('files', nargs='*',
+                        default=sorted(glob.glob(os.path.join(
+                            os.path.dirname(os.path.abspath(__file__)),
+                            'bff_files', '*.bff'))),
+                        help='.bff files (default: bff_files/*.bff)')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--engine', choices=sorted(ENGINES),
+                        default='backtrack')
+    parser.add_argument('--micro', action='store_true',
+                        help='time the solver stages instead of solves')
+    parser.add_argument('--scaling', type=int, nargs='+', metavar='SIZE',
+                        help='solve generated puzzles of these sizes '
+                             'instead of the files')
+    parser.add_argument('--count', type=int, default=3,
+                        help='generated puzzles per size (--scaling)')
+    parser.add_argument('--timeout', type=float, default=60.0,
+                        help='seconds allowed per generated puzzle')
+    parser.add_argument('--baseline', default='bench_baseline.json',
+                        help='baseline file to compare with or write')
+    parser.add_argument('--write-baseline', action='store_true',
+                        help='save the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=1.5,
+                        help='slowdown factor counted as a regression')
+    args = parser.parse_args(argv)
+
+    if args.scaling:
+        results = {'engine': args.engine,
+                   'scaling': bench_scaling(args.scaling, args.count,
+                                            args.engine, args.timeout)}
+    else:
+        results = run(args.files, args.rounds, args.engine, args.micro)
+    for size, value in results.get('scaling', {}).items():
+        print('%3sx%-3s median %10.2f ms  max %10.2f ms  %10.0f cand  '
+              '%d timeouts' % (size, size, value['median'] * 1e3,
+                               value['max'] * 1e3, value['candidates'],
+                               value['timeouts']))
+    for name, value in results.get('puzzles', {}).items():
+        print('%-22s median %8.2f ms  p95 %8.2f ms  %10.0f cand/s  '
+              '%7.3f rej/us  %8.1f KiB  shrink %6.2fx' % (
+                  name, value['median'] * 1e3, value['p95'] * 1e3,
+                  value['candidates_per_s'], value.get('rejected_per_us', 0),
+                  value['peak_kib'], value.get('shrink', 1.0)))
+    for name, value in results.get('micro', {}).items():
+        print('%-22s ' % name + '  '.join(
+            '%s %.1f us' % i for i in value.items()))
+
+    if args.write_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        # Solve and stage timings are kept side by side in one baseline.
+        baseline.update({k: v for k, v in results.items()
+                          if k != 'puzzles' or v})
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        return 0
+    if not os.path.exists(args.baseline):
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    for name, metric, old, new in regressions:
+        print('REGRESSION %s %s: %.6g -> %.6g' % (name, metric, old, new))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,188 @@
+'''
+Generate random LAZOR puzzles, for measuring how the solver scales to
+boards bigger than the ones in bff_files/.
+
+Every puzzle is built from a known solution: the blocks are put on a
+random board first, the lasers are traced on it and the points are
+picked from the points the lasers hit. So every generated puzzle can
+be solved. The same seed always gives the same puzzles.
+
+    python GenerateLAZOR.py generated --size 10 10 -A 6 -B 2 -C 1 \\
+        --lasers 2 --targets 5 --count 10 --seed 1
+'''
+
+import argparse
+import os
+import random
+import sys
+
+from SolveLAZOR import Puzzle, define_grid, trace_all
+
+
+def laser_starts(width, height):
+    '''
+    Returns every laser start on the edge of a width x height grid that
+    points into the grid, as (x, y, vx, vy).
+    '''
+    starts = []
+    for y in range(1, height * 2, 2):
+        for vy in (-1, 1):
+            starts.append((0, y, 1, vy))
+            starts.append((width * 2, y, -1, vy))
+    for x in range(1, width * 2, 2):
+        for vx in (-1, 1):
+            starts.append((x, 0, vx, 1))
+            starts.append((x, height * 2, vx, -1))
+    return starts
+
+
+def generate_puzzle(width, height, x_density=0.1, A=2, B=0, C=0,
+                    lasers=1, targets=3, seed=None, attempts=100):
+    '''
+    Make a random puzzle together with a solution of it.
+
+    **Parameters**
+        width, height: *int
+            Size of the board in blocks.
+        x_density: *float
+            Chance of each cell being an 'x', where no block may go.
+        A, B, C: *int
+            Number of reflect, opaque and refract blocks to place.
+        lasers: *int
+            Number of lasers, all starting on the edge of the board.
+        targets: *int
+            Number of points the lasers have to hit.
+        seed: *int, optional
+            Seed of the random numbers, to get the same puzzle again.
+        attempts: *int
+            How many boards to try before giving up.
+
+    **Returns**
+        puzzle: *Puzzle
+            The puzzle, with every block to place left out of the grid.
+        solution: *list
+            A solved grid of the puzzle.
+
+    **Raises**
+        ValueError: if there are more blocks than cells, or if no board
+            where the lasers hit enough points was found.
+    '''
+    if A + B + C > width * height:
+        raise ValueError('%d blocks do not fit on a %dx%d board' %
+                         (A + B + C, width, height))
+    rng = random.Random(seed)
+    starts = laser_starts(width, height)
+    for attempt in range(attempts):
+        cells = ['x' if rng.random() < x_density else 'o'
+                 for i in range(width * height)]
+        open_cells = [i for i, cell in enumerate(cells) if cell == 'o']
+        if len(open_cells) < A + B + C:
+            continue
+        Grid = tuple(' '.join(cells[r * width:(r + 1) * width])
+                     for r in range(height))
+        for i, block in zip(rng.sample(open_cells, A + B + C),
+                            'A' * A + 'B' * B + 'C' * C):
+            cells[i] = block
+        solution = [' '.join(cells[r * width:(r + 1) * width])
+                    for r in range(height)]
+        L = tuple(sorted(rng.sample(starts, lasers)))
+        hit = trace_all(L, define_grid(solution))
+        hit.difference_update(laser[:2] for laser in L)
+        if len(hit) < targets:
+            continue
+        # Points only the placed blocks lead the lasers to come first,
+        # so the puzzle can not be solved by leaving the blocks out.
+        empty = trace_all(L, define_grid(Grid))
+        needed = sorted(hit - empty)
+        rest = sorted(hit & empty)
+        rng.shuffle(needed)
+        rng.shuffle(rest)
+        P = tuple(sorted((needed + rest)[:targets]))
+        return Puzzle(P, A, B, C, L, Grid), solution
+    raise ValueError('no %dx%d board with %d points hit in %d attempts' %
+                     (width, height, targets, attempts))
+
+
+def format_bff(puzzle, comment=None):
+    '''
+    Returns the lines of a .bff file for puzzle, as read by ReadInbff.
+
+    **Parameters**
+        puzzle: *Puzzle
+        comment: *string, optional
+            Written at the top of the file, after a #.
+    '''
+    P, A, B, C, L, Grid = puzzle
+    lines = []
+    if comment:
+        lines += ['# ' + line for line in comment.splitlines()] + ['']
+    lines += ['GRID START'] + list(Grid) + ['GRID STOP', '']
+    for key, n in zip('ABC', (A, B, C)):
+        if n:
+            lines.append('%s %d' % (key, n))
+    lines.append('')
+    lines += ['L %d %d %d %d' % tuple(laser) for laser in L]
+    lines.append('')
+    lines += ['P %d %d' % tuple(pt) for pt in P]
+    return lines
+
+
+def write_bff(filename, puzzle, comment=None):
+    '''
+    Write puzzle to the .bff file filename.
+    '''
+    with open(filename, 'w') as f:
+        f.write('\n'.join(format_bff(puzzle, comment)) + '\n')
+
+
+def generate_files(directory, count, width, height, seed=0, **params):
+    '''
+    Write count generated puzzles to directory, seeded seed, seed + 1,
+    and so on, and return their file names. params are passed on to
+    generate_puzzle.
+    '''
+    os.makedirs(directory, exist_ok=True)
+    files = []
+    for n in range(seed, seed + count):
+        puzzle, solution = generate_puzzle(width, height, seed=n, **params)
+        filename = os.path.join(directory, 'gen_%dx%d_%d.bff' %
+                                (width, height, n))
+        write_bff(filename, puzzle, 'Generated by GenerateLAZOR.py, '
+                  'seed %d' % n)
+        files.append(filename)
+    return files
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Write random solvable .bff files.')
+    parser.add_argument('directory', help='where to write the files')
+    parser.add_argument('--size', type=int, nargs=2, default=(5, 5),
+                        metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--x-density', type=float, default=0.1,
+                        help="chance of a cell being an 'x'")
+    parser.add_argument('-A', type=int, default=2, help='reflect blocks')
+    parser.add_argument('-B', type=int, default=0, help='opaque blocks')
+    parser.add_argument('-C', type=int, default=0, help='refract blocks')
+    parser.add_argument('--lasers', type=int, default=1)
+    parser.add_argument('--targets', type=int, default=3)
+    parser.add_argument('--count', type=int, default=1,
+                        help='number of puzzles')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the first puzzle')
+    args = parser.parse_args(argv)
+    try:
+        files = generate_files(args.directory, args.count, *args.size,
+                               seed=args.seed, x_density=args.x_density,
+                               A=args.A, B=args.B, C=args.C,
+                               lasers=args.lasers, targets=args.targets)
+    except ValueError as e:
+        sys.stderr.write('%s\n' % e)
+        return 1
+    for filename in files:
+        print(filename)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,10 +2,131 @@
 Initial python file for reading in .bff files for their information.
 '''
 
+import collections
+import contextlib
+import math
+import os
 import random
 import time
 import itertools
-import copy
+
+
+class BffError(ValueError):
+    '''
+    A .bff file that can not be read. The message starts with the file
+    name and the line number of the problem.
+    '''
+
+
+class Puzzle(collections.namedtuple('Puzzle', 'P A B C L Grid')):
+    '''
+    One parsed puzzle. It is a tuple (P, A, B, C, L, Grid), so it
+    unpacks like the result of ReadInbff always did, but every field is
+    immutable, so a Puzzle can be hashed and used as a dictionary key.
+
+        P: *tuple
+            Points for laser to intersect, (x, y) tuples.
+        A, B, C: *int
+            Number of Reflect, Opaque and Refract Blocks.
+        L: *tuple
+            Lazor positions and velocities, (x, y, vx, vy) tuples.
+        Grid: *tuple
+            The rows of the grid, each a string of the cells separated
+            by single spaces, for example 'o B x'.
+    '''
+    __slots__ = ()
+
+
+def parse_bff(lines, filename='<bff>'):
+    '''
+    Parse the lines of a .bff file in one pass, checking every line.
+
+    **Parameters**
+        lines: *iterable
+            The lines of the file, for example the open file itself, so
+            the whole text never has to be in memory.
+        filename: *string
+            Used in the error messages.
+
+    **Returns**
+        puzzle: *Puzzle
+
+    **Raises**
+        BffError: for any line that is not a comment, a blank line, a
+            grid row between GRID START and GRID STOP, or one of
+            'A n', 'B n', 'C n', 'L x y vx vy' and 'P x y'; for a grid
+            with rows of different lengths; and for a file without a
+            grid or without a laser.
+    '''
+    P = []
+    L = []
+    counts = {}
+    Grid = None
+    # the rows read so far while inside GRID START ... GRID STOP
+    rows = None
+    number = 0
+
+    def error(message):
+        raise BffError('%s:%d: %s' % (filename, number, message))
+
+    def numbers(fields, n):
+        if len(fields) != n:
+            error('expected %d numbers, found %d' % (n, len(fields)))
+        try:
+            return tuple(int(i) for i in fields)
+        except ValueError:
+            error('not a whole number in %r' % ' '.join(fields))
+
+    for number, line in enumerate(lines, 1):
+        # everything after a # is a comment
+        line = line.partition('#')[0].strip()
+        if not line:
+            continue
+        if rows is not None:
+            if line == 'GRID STOP':
+                if not rows:
+                    error('the grid has no rows')
+                Grid = tuple(rows)
+                rows = None
+                continue
+            cells = line.split()
+            for cell in cells:
+                if cell not in ('x', 'o', 'A', 'B', 'C'):
+                    error('unknown grid cell %r' % cell)
+            if rows and len(cells) != rows[0].count(' ') + 1:
+                error('row of %d cells in a grid %d cells wide' %
+                      (len(cells), rows[0].count(' ') + 1))
+            rows.append(' '.join(cells))
+        elif line == 'GRID START':
+            if Grid is not None:
+                error('a second grid')
+            rows = []
+        else:
+            key, *fields = line.split()
+            if key in ('A', 'B', 'C'):
+                if key in counts:
+                    error('the number of %s blocks is given twice' % key)
+                n, = numbers(fields, 1)
+                if n < 0:
+                    error('a negative number of %s blocks' % key)
+                counts[key] = n
+            elif key == 'L':
+                laser = numbers(fields, 4)
+                if laser[2] not in (-1, 1) or laser[3] not in (-1, 1):
+                    error('a laser velocity must be 1 or -1')
+                L.append(laser)
+            elif key == 'P':
+                P.append(numbers(fields, 2))
+            else:
+                error('unknown line %r' % line)
+    if rows is not None:
+        error('GRID START without GRID STOP')
+    if Grid is None:
+        raise BffError('%s: no grid' % filename)
+    if not L:
+        raise BffError('%s: no laser' % filename)
+    return Puzzle(tuple(P), counts.get('A', 0), counts.get('B', 0),
+                  counts.get('C', 0), tuple(L), Grid)
 
 
 def ReadInbff(bfffile):
@@ -19,66 +140,47 @@ def ReadInbff(bfffile):
             The absolute directory path to the desired bff file.
 
     **Returns**
-        Grid: *list
-            Initial Grid
-        L: *list
-            Lazor position and velocity. First two numbers are where the
-            the laser starts, and the last two numbers are the
-            x and y velocities.
-        A: *int
-            Number of Reflect Blocks
-        B: *int
-            Number of Opaque Blocks
-        C: *int
-            Number of Refract Blocks
-        P: *list
-            Points for laser to intersect
+        puzzle: *Puzzle
+            The tuple (P, A, B, C, L, Grid) with
+            P, the points for laser to intersect;
+            A, B and C, the number of Reflect, Opaque and Refract Blocks;
+            L, the lazor positions and velocities. First two numbers are
+            where the laser starts, and the last two numbers are the x
+            and y velocities;
+            Grid, the initial grid.
+
+    **Raises**
+        BffError: if the file is not a valid .bff file, see parse_bff.
     '''
-    P = []
-    Grid = []
-    L = []
-    copy = False
-    A = 0
-    B = 0
-    C = 0
     with open(bfffile, 'r') as f:
-        for line in f:
-            # Ignore comment lines
-            if '#' in line:
-                continue
-            # Take in information from lines that start with P.
-            elif line.startswith('P'):
-                appending = line.partition('P')[2].strip()
-                appending = [int(i) for i in appending.split() if i.isdigit()]
-                P.append(appending)
-            # Take in information from lines that start with A.
-            elif line.startswith('A'):
-                A = int(line.partition('A')[2].strip())
-            # Take in information from lines that start with B.
-            elif (line.startswith('B') and
-                  line.partition('B')[2].strip().isdigit()):
-                B = int(line.partition('B')[2].strip())
-            # Take in information from lines that start with C.
-            elif line.startswith('C'):
-                C = int(line.partition('C')[2].strip())
-            # Take in information from lines that start with L.
-            elif line.startswith('L'):
-                appending = line.partition('L')[2].strip()
-                appending = [int(i) for i in appending.split()]
-                L.append(appending)
-            # Start reading in lines after GRID START for Grid
-            elif line.startswith('GRID START'):
-                copy = True
-                continue
-            # Stop reading in lines after GRID STOP for Grid
-            elif line.startswith('GRID STOP'):
-                copy = False
-                continue
-            # Sucessively add lines to Grid after GRID START and
-            # before GRID STOP
-            elif copy:
-                Grid.append(line.strip().replace("  ", ""))
-    return P, A, B, C, L, Grid
+        return parse_bff(f, bfffile)
+
+
+def load_puzzle(puzzle):
+    '''
+    Return puzzle if it is already a Puzzle (or a tuple like one),
+    otherwise read it from the .bff file of that name.
+    '''
+    if isinstance(puzzle, str):
+        return ReadInbff(puzzle)
+    return puzzle
+
+
+def iter_puzzles(files):
+    '''
+    Read many .bff files one after the other, only ever holding one
+    line of one file in memory.
+
+    **Parameters**
+        files: *iterable
+            The names of the files.
+
+    **Returns**
+        puzzles: *generator
+            Yields (file name, Puzzle) for every file.
+    '''
+    for bfffile in files:
+        yield bfffile, ReadInbff(bfffile)
 
 # Make class to define the blocks. Save the properties of each block in
 # the block class.
@@ -190,19 +292,200 @@ class Block:
 
     def __call__(self, block_type, lr, va, vb):
         '''
-        Return a specific velocity based off of what Block is present
-        in the reformatted output define_grid.
+        Return a specific velocity based off of what Block is present.
+        block_type is either the block letter or its byte code in a Board.
         '''
-        if 'B' in block_type:
+        if block_type == 'B' or block_type == OPAQUE:
             return Block.Opaque(lr, va, vb)
-        elif 'A' in block_type:
+        elif block_type == 'A' or block_type == REFLECT:
             return Block.Reflect(lr, va, vb)
-        elif 'C' in block_type:
+        elif block_type == 'C' or block_type == REFRACT:
             return Block.Refract(lr, va, vb)
         else:
             return va, vb
 
 
+# Byte codes for the cells of a Board. They are the ASCII codes of the
+# letters used in the .bff files, so a row of cells turns back into text
+# with bytes(...).decode().
+OPEN = ord('o')
+NO_BLOCK = ord('x')
+REFLECT = ord('A')
+OPAQUE = ord('B')
+REFRACT = ord('C')
+
+
+class Board:
+    '''
+    Compact model of the grid. Every block cell is one byte of a flat
+    bytearray, stored row by row, so placing or removing a block is a
+    single byte write and the grid never has to be rebuilt.
+
+    Lattice points are not stored at all. A laser at (x, y) always sits
+    on the side of a block: on a left/right side when x is even and on
+    a top/bottom side when y is even. The cell it runs into next only
+    depends on which side it is on and on its velocity, so it is found
+    with a little arithmetic in block_ahead.
+
+    Which cells are 'x' is fixed for the whole solve, so the jump table
+    of flight_table is built once per board and shared with its copies.
+    '''
+    __slots__ = ('width', 'height', 'cells', 'flights')
+
+    def __init__(self, width, height, cells, flights=None):
+        self.width = width
+        self.height = height
+        self.cells = cells
+        self.flights = flights
+
+    def index(self, r, c):
+        '''
+        Return the position in cells of the block at row r, column c.
+        '''
+        return r * self.width + c
+
+    def block_ahead(self, x, y, vx, vy):
+        '''
+        Return the index of the block a laser at lattice point (x, y)
+        moving with velocity (vx, vy) is about to hit.
+
+        **Parameters**
+            x: *int
+                The x coordinate of the laser.
+            y: *int
+                The y coordinate of the laser.
+            vx: *int
+                The x velocity of the laser.
+            vy: *int
+                The y velocity of the laser.
+
+        **Returns**
+            idx: *int
+                The index of the block in cells, or -1 if the laser is
+                about to leave the grid.
+        '''
+        if x % 2 == 0:
+            # On a left/right side, so the block is beside the laser.
+            c = (x + vx) // 2
+            r = y // 2
+        else:
+            # On a top/bottom side, so the block is above or below.
+            c = x // 2
+            r = (y + vy) // 2
+        if 0 <= c < self.width and 0 <= r < self.height:
+            return r * self.width + c
+        return -1
+
+    def bit(self, x, y):
+        '''
+        Return the bit of lattice point (x, y) in a coverage mask. The
+        points are numbered row by row, 2 * width + 1 to a row, so only
+        points on the grid have a bit of their own.
+        '''
+        return 1 << (y * (self.width * 2 + 1) + x)
+
+    def target_mask(self, P):
+        '''
+        Return the coverage mask with the bits of all the points in P.
+        A point off the grid gets the bit just past the last point,
+        which no laser sets, so a mask with it is never covered.
+        '''
+        grid_w = self.width * 2
+        grid_h = self.height * 2
+        mask = 0
+        for x, y in P:
+            if pos_chk(x, y, grid_w, grid_h):
+                mask |= self.bit(x, y)
+            else:
+                mask |= self.bit(0, grid_h + 1)
+        return mask
+
+    def copy(self):
+        '''
+        Return an independent copy of the board.
+        '''
+        return Board(self.width, self.height, bytearray(self.cells),
+                     self.flights)
+
+    def flight_table(self):
+        '''
+        Return the FlightTable of the board, building it on first use.
+        '''
+        if self.flights is None:
+            self.flights = FlightTable(self)
+        return self.flights
+
+    def rows(self):
+        '''
+        Return the board in the same format as Grid from ReadInbff,
+        a list of space separated rows.
+        '''
+        w = self.width
+        return [" ".join(self.cells[n:n + w].decode())
+                for n in range(0, len(self.cells), w)]
+
+    def __eq__(self, other):
+        return (isinstance(other, Board) and self.width == other.width and
+                self.height == other.height and self.cells == other.cells)
+
+
+class FlightTable:
+    '''
+    Jump table for lasers in free flight.
+
+    A laser whose next cell is an 'x' (or outside the grid) goes
+    straight on, whatever the rest of the board holds. For every such
+    state the table gives the states the laser runs through until it
+    reaches the next interaction point, a point in front of a cell that
+    is open or holds a block, or leaves the grid, together with the
+    coverage mask of those points (see Board.bit). The tracers jump over
+    the whole stretch at once instead of stepping through it.
+
+    The table only depends on the size of the board and on which cells
+    are 'x', so it stays valid as blocks are placed on open cells.
+    '''
+    __slots__ = ('key', 'jumps')
+
+    def __init__(self, board):
+        '''
+        **Parameters**
+            board: *Board
+                The board to build the table for.
+        '''
+        cells = board.cells
+        grid_w = board.width * 2
+        grid_h = board.height * 2
+        # Boards with the same key have the same table, see TraceCache.
+        self.key = (board.width, bytes(i == NO_BLOCK for i in cells))
+
+        def interacts(x, y, vx, vy):
+            idx = board.block_ahead(x, y, vx, vy)
+            return idx >= 0 and cells[idx] != NO_BLOCK
+
+        # state -> (states passed, interaction state or None, mask of
+        # the points passed), for every state in front of an 'x' or the
+        # edge of the grid
+        self.jumps = {}
+        for x in range(grid_w + 1):
+            for y in range(1 - x % 2, grid_h + 1, 2):
+                for vx, vy in ((1, 1), (1, -1), (-1, 1), (-1, -1)):
+                    if interacts(x, y, vx, vy):
+                        continue
+                    passed = []
+                    end = None
+                    mask = 0
+                    px, py = x + vx, y + vy
+                    while pos_chk(px, py, grid_w, grid_h):
+                        passed.append((px, py, vx, vy))
+                        mask |= board.bit(px, py)
+                        if interacts(px, py, vx, vy):
+                            end = passed[-1]
+                            break
+                        px += vx
+                        py += vy
+                    self.jumps[(x, y, vx, vy)] = (tuple(passed), end, mask)
+
+
 def pos_chk(x, y, width, height):
     '''
     Validate if the coordinates specified (x and y) are within the maze.
@@ -213,9 +496,10 @@ def pos_chk(x, y, width, height):
             An x coordinate to check if it resides within the maze.
         y: *int*
             A y coordinate to check if it resides within the maze.
-        nBlocks: *int*
-            How many blocks wide the maze is.  Should be equivalent to
-            the length of the maze (ie. len(maze)).
+        width: *int*
+            The largest x coordinate in the maze.
+        height: *int*
+            The largest y coordinate in the maze.
 
     **Returns**
 
@@ -227,350 +511,456 @@ def pos_chk(x, y, width, height):
 
 def define_grid(Grid):
     '''
-    Generate list that has correct coordinate values
-    for each element (A, B, C, o, x).
+    Generate the compact Board for a grid (A, B, C, o, x).
+
     **Parameters**
         Grid: *list
-                Initial grid.
+                Initial grid, or a whole Puzzle.
 
     **Returns**
-        grid_coords: *list
-                Expanded grid that contains the correct
-                coordinates x, y for solving maze.
-    '''
-    y_values = len(Grid) * 2
-    grid_elements = []
-    # First, we have to split the row strings and instead make them into
-    # nested lists. Save into grid_elements.
-    for i in Grid:
-        grid_elements.append(i.split(' '))
-    count = 0
-    grid_expanded_y = []
-    counter = 0
-
-    # Next, we want to repeat each row to put into coordinates.
-    # For example, a row of 'o', 'o', 'o'  will need to be multiplied by three
-    # become 'o', 'o', 'o','o', 'o', 'o','o', 'o', 'o' if it is the first row.
-    # However, if it is not in the first row,
-    # then we will need to multiply by two.
-    # It will instead become 'o', 'o', 'o', 'o', 'o', 'o'.
-    # This is because there are three rows between y = 0 to y = 2
-    # but once y = 2 has been reached, each new block is only another 2 rows,
-    # such that y = 3 and y = 4 is the second row,
-    # and y = 5 and y = 6 is the third row and so on.
-    # This will be saved as grid_expanded_y.
-    for element in grid_elements:
-        if element == grid_elements[0] and counter == 0:
-            # This loop tests whether the element we are at is = to first row.
-            # The purpose of the counter is so that if there is another row
-            # that is identical to the first row,
-            # we don't multiple that one by three as well.
-            grid_expanded_y.append(element * 3)
-            counter = 1
-        else:
-            # If we have already done the first row,
-            # then we go into this loop & start multiplying by 2 instead of 3.
-            grid_expanded_y.append(element * 2)
-
-    # Now that we have completed the row expansion,
-    # we need to do the column expansion.
-    # We will multiply each element within nested lists by three.
-    # We will do times three for all of them because we will
-    # eventually need to combine the strings horizontally.
-    # This will be saved as grid_expanded, which is a single list.
-    grid_expanded = []
-    for element in grid_elements:
-        count += len(element)
-    for element in grid_expanded_y:
-        for i in range(len(element)):
-            grid_expanded.append(element[i] * 3)
-
-    x_values = int((count / (y_values / 2)) * 2)
-    # x_values is the maximum value for the coordinate system that we use,
-    # in which each block takes up 3 values in x.
-    # For example, the top left block is from x = 0 to x = 2,
-    # and the one next to it takes up x = 2 to x = 4.
-    x_vals = int(x_values / 2)
-    # x_vals is the true number of blocks in each row in initial grid.
-
-    # Now that we have the list, we need to group it again
-    # such that it contains nested lists representing each row.
-    # This will be saved as grid_grouped_list.
-    # Note that we still have multiples within each element in nested lists.
-    # Instead of 'o' being an element, it's 'ooo', for example.
-    grid_grouped_list = [grid_expanded[n:n + x_vals] for n in
-                         range(0, len(grid_expanded), x_vals)]
-
-    # Next, we will need to separate out the multiples
-    # into their own elements and put them each as nested lists.
-    # For example, 'ooo' will become ['o', 'o', 'o'].
-    # This will be save into grid_grouped.
-    grid_grouped = []
-    for element in grid_grouped_list:
-        for i in range(len(element)):
-            grid_grouped.append(list(element[i]))
-    count = 0
-
-    # Next, we want to get rid of all the nested lists
-    # and instead make one long list.
-    # This will be saved as grid_grouped_single_list.
-    grid_grouped_single_list = []
-    for i in range(len(grid_grouped)):
-        for j in range(3):
-            grid_grouped_single_list.append(grid_grouped[i][j])
-
-    # Next, we want to combine the elements horizontally
-    # such that at x = 2, a 'o' block neighboring an 'o' block will be 'oo'.
-    # And a 'B' block neighboring a 'o' block will be 'Bo'.
-    # We will save these as nested lists, where each list represents a row (x)
-    # and the number of the element in each list represents the column (y).
-    max_rows = x_vals * 3
-    grid_coords = []
-    row_cnt = 0
-    row = []
-    for i, letter in enumerate(grid_grouped_single_list):
-        if i > (row_cnt + 1) * max_rows - 1:
-            if row != []:
-                # Once row is complete, we append entire row to grid_coords.
-                grid_coords.append(row)
-                row = []
-                # We blank the row again to start working on the next row,
-                # and we increase row count by 1.
-                row_cnt += 1
-        if i != (row_cnt * max_rows) and i % 3 == 0:
-            # Through trial and error, we see that we need this loop.
-            # This loop is crucial because it makes the appending skip over
-            # the string that we have already combined.
-            # For example, 'o', 'o', 'o', 'B', 'B', 'B', 'x', 'x', 'x'
-            # ends up being 'o', 'o', 'oB', 'B', 'B', 'Bx', 'x', 'x'.
-            # This is incorrect because it has two B's where
-            # it should only have 1 B to represent the middle of the block.
-            pass
-        elif i in list(range(row_cnt * max_rows + 2,
-                             (row_cnt + 1) * max_rows - 1, 3)):
-            # If we are at the side of the block,
-            # we want to add strings together.
-            # For example, we have 'o', 'o', 'o', 'B', 'B', 'B' as first row,
-            # representing an 'o' block next to a 'B' block.
-            # We want to combine the 2nd element(starting count at 0)
-            # with the 3rd element. This results in 'o', 'o', 'oB', 'B', 'B'.
-            # We repeat this in increments of 3 until we are 2 counts
-            # away from the rightmost edge of the grid.
-            # We save the strings to temp and then append temp to the row.
-            temp = grid_grouped_single_list[i] \
-                + grid_grouped_single_list[i + 1]
-            row.append(temp)
-        else:
-            # If we are not at the sides of the block,
-            # then we are in the middle.
-            # In this case, we just append the original element
-            # because we are not touching another block.
-            temp = grid_grouped_single_list[i]
-            row.append(temp)
-    grid_coords.append(row)
-
-    # Lastly, we want to consider when the blocks are touching
-    # i.e. (share a side) in the y direction,
-    # meaning that one is above the other and they share that y coordinate.
-    # We incorporate this into grid_coords, which is our final output.
-    try:
-        for i in range(len(grid_coords)):
-            if i % 2 == 0 and i != 0:
-                # If the y value is even and we are not at 0
-                # (since Python registers 0 to be even),
-                # then we want to add the string in the row above
-                # (but at same y value)
-                # to the string in the row below.
-                for j in range(1, x_values):
-                    grid_coords[i][j] = grid_coords[i - 1][j] + \
-                        grid_coords[i + 1][j]
-    except IndexError:
-        # This loop results in an error,
-        # but it does not prevent the code from getting the correct answer.
-        pass
-    # Note: the corners, where there are 4 blocks touching,
-    # are incorrectly generated by this code.
-    # However, the laser will never pass through the corners,
-    # so this is not an issue for solving the grid.
-    return grid_coords
+        board: *Board
+                One byte per block cell. Use Board.block_ahead to find
+                the block in front of a laser at any coordinate x, y.
+    '''
+    if isinstance(Grid, Puzzle):
+        Grid = Grid.Grid
+    rows = [i.split() for i in Grid]
+    width = len(rows[0])
+    cells = bytearray()
+    for row in rows:
+        cells.extend(ord(i) for i in row)
+    return Board(width, len(rows), cells)
+
+
+def laser_step(board, x, y, vx, vy):
+    '''
+    Work out what the block in front of a laser at (x, y) moving with
+    velocity (vx, vy) does to it, before it moves on to the next point.
+
+    **Parameters**
+        board: *Board
+            modified intital grid
+        x: *int
+            The x coordinate of the laser.
+        y: *int
+            The y coordinate of the laser.
+        vx: *int
+            The x velocity of the laser.
+        vy: *int
+            The y velocity of the laser.
+
+    **Returns**
+        velocity: *tuple or None
+            The velocity the laser leaves with, or None if it stops.
+        extra: *list or None
+            The position and velocity of the extra laser split off by a
+            C block, or None.
+        looked: *tuple
+            The indices of every cell whose contents decided the outcome.
+    '''
+    cells = board.cells
+    idx = board.block_ahead(x, y, vx, vy)
+    if idx < 0:
+        return (vx, vy), None, ()
+    block_type = cells[idx]
+    if block_type == OPEN or block_type == NO_BLOCK:
+        return (vx, vy), None, (idx,)
+    if block_type == OPAQUE:
+        return None, None, (idx,)
+    # check next hit left/right (1) or top/bottom (0)
+    hit = 1 if x % 2 == 0 else 0
+    ch = Block.Refract(hit, vx, vy)
+    # The reflected laser heads for the block on the other side of this
+    # point. If that is an A or B block too, the laser is stuck between
+    # the two blocks.
+    back = board.block_ahead(x, y, ch[0], ch[1])
+    if back < 0:
+        stuck = False
+        looked = (idx,)
+    else:
+        stuck = cells[back] == REFLECT or cells[back] == OPAQUE
+        looked = (idx, back)
+    if block_type == REFLECT:
+        if stuck:
+            return None, None, looked
+        return Block.Reflect(hit, vx, vy), None, looked
+    # C block: the reflected part becomes an extra laser and the rest
+    # passes straight through
+    extra = None if stuck else [x + ch[0], y + ch[1], ch[0], ch[1]]
+    return (ch[2], ch[3]), extra, looked
 
 
-def path_loop(L, new_grid):
+def path_loop(L, new_grid, max_steps=None, seen=None, looked=None):
 
     '''
-    Returns a list of one path taken by the laser. Goes hand-in-hand with
+    Returns the points passed by one laser. Goes hand-in-hand with
     the function get_all_paths_taken as this function
     does not contain the additional paths taken from a C block split.
 
+    The laser stops as soon as it is back in a state (position and
+    velocity) it has already been in, because from there it would only go
+    round the same loop again. Stretches of 'x' cells are crossed in one
+    jump using the FlightTable of the board; only the interaction points
+    count as steps and as seen states.
+
     **Parameters**
         L: *list
             Lazor position and velocity. First two numbers are where the
             the laser starts, and the last two numbers are the
             x and y velocities.
 
-        new_grid: *list
+        new_grid: *Board
             modified intital grid
 
+        max_steps: *int, optional
+            Stop after this many steps whatever happens, as a safety net.
+
+        seen: *set, optional
+            States other lasers have already been in. The laser stops on
+            reaching one of them, as the rest of its path is already
+            known. The states of this laser are added to it.
+
+        looked: *dict, optional
+            Gets the index of every cell whose contents decided the path,
+            as keys in the order they were first looked at.
+
     **Returns**
-        laser_pos: *list
-            A list of all the positions taken
+        laser_pos: *set
+            All the positions taken
         refract_list: *list
             A list of the laser position and velocity after hitting the C block
     '''
+    x, y, vx, vy = L[0]
+    grid_w = new_grid.width * 2
+    grid_h = new_grid.height * 2
+    jumps = new_grid.flight_table().jumps
+
+    # all the positions the laser passed
+    laser_pos = set()
+    # all the (x, y, vx, vy) states the laser has been in
+    if seen is None:
+        seen = set()
+    # additional list for refract block
+    refract_list = []
 
-    # starting position (user input)
-    position = tuple(L[0][:2])
-    # starting velocity (user input)
-    vx = L[0][2]
-    vy = L[0][3]
+    steps = 0
+    while pos_chk(x, y, grid_w, grid_h):
+        state = (x, y, vx, vy)
+        if state in seen or steps == max_steps:
+            break
+        seen.add(state)
+        steps += 1
+        laser_pos.add((x, y))
+        flight = jumps.get(state)
+        if flight is not None:
+            # nothing but 'x' cells ahead: jump to the next interaction
+            # point, or out of the grid
+            passed, end, mask = flight
+            laser_pos.update(i[:2] for i in passed)
+            if end is None:
+                break
+            x, y = end[:2]
+            continue
+        velocity, extra, cells = laser_step(new_grid, x, y, vx, vy)
+        if looked is not None:
+            for i in cells:
+                looked.setdefault(i)
+        if extra is not None:
+            # append into the extra refract list
+            refract_list.append(extra)
+        if velocity is None:  # B block, or stuck
+            break
+        vx, vy = velocity
+        x += vx
+        y += vy
 
-    # list of all the positions the laser passed
-    laser_pos = [position]
-    # list of the block types the laser passed
-    blk_type = ['o', 'o', 'o']
+    return laser_pos, refract_list
 
-    grid_h = len(new_grid)
-    grid_w = len(new_grid[0])
 
-    # additional list for refract block
-    refract_list = []
+class CachedTrace:
+    '''
+    One path stored in a TraceCache.
+    '''
+    __slots__ = ('points', 'mask', 'spawns', 'branch', 'size')
+
+    def __init__(self, points, mask, spawns, branch, size):
+        self.points = points
+        # the points again, as a coverage mask
+        self.mask = mask
+        self.spawns = spawns
+        # [(node, contents)] from the root down to this path, to find it
+        # again when it is evicted
+        self.branch = branch
+        self.size = size
+
+
+class TraceCache:
+    '''
+    Bounded LRU cache of traced laser paths.
+
+    A path only depends on its start state and on the contents of the
+    cells it looked at. The paths from one start state are kept in a
+    decision tree: every node holds the next cell the laser looks at
+    and branches on what is in it, and the leaves hold the paths. A
+    lookup walks the tree reading one cell per node, so checking a
+    cached path against a new board takes a few lookups and no tracing.
+    '''
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        '''
+        **Parameters**
+            max_bytes: *int
+                Rough limit on the memory used by the cached paths. The
+                least recently used ones are evicted beyond it.
+        '''
+        self.max_bytes = max_bytes
+        # FlightTable.key + start state + (max_steps,) -> root node, a
+        # node being [cell, {contents: child}]
+        self.roots = {}
+        # CachedTrace -> None, least recently used first
+        self.lru = collections.OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, start, board, max_steps=None):
+        '''
+        Return the CachedTrace for a laser from start on board, cut off
+        after max_steps like path_loop, or None.
+        '''
+        cells = board.cells
+        node = self.roots.get(board.flight_table().key + start +
+                              (max_steps,))
+        while node is not None and not isinstance(node, CachedTrace):
+            node = node[1].get(cells[node[0]])
+        if node is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.lru.move_to_end(node)
+        return node
+
+    def store(self, start, board, looked, points, spawns, max_steps=None):
+        '''
+        Add the path of a laser from start on board, traced with
+        max_steps. looked holds the cells the path looked at, in the
+        order it first looked at them.
+
+        **Returns**
+            entry: *CachedTrace
+        '''
+        cells = board.cells
+        looked = list(looked)
+        # rough size in bytes of the sets, mask, tuples and tree nodes
+        size = 200 + 80 * len(points) + 120 * len(spawns) + \
+            150 * len(looked) + board.width * board.height // 2
+        entry = CachedTrace(frozenset(points), board.target_mask(points),
+                            tuple(tuple(i) for i in spawns), [], size)
+        # The paths only fit boards of the same size and with the same
+        # 'x' cells, which the tracers jump over without looking at. A
+        # path cut off early is only a path for the same max_steps.
+        start = board.flight_table().key + start + (max_steps,)
+        if not looked:
+            self.roots[start] = entry
+        else:
+            node = self.roots.get(start)
+            if node is None or isinstance(node, CachedTrace):
+                node = self.roots[start] = [looked[0], {}]
+            for n, i in enumerate(looked):
+                contents = cells[i]
+                entry.branch.append((node, contents))
+                if n + 1 == len(looked):
+                    node[1][contents] = entry
+                else:
+                    child = node[1].get(contents)
+                    if child is None or isinstance(child, CachedTrace):
+                        child = node[1][contents] = [looked[n + 1], {}]
+                    node = child
+        entry.branch.insert(0, (self.roots, start))
+        self.lru[entry] = None
+        self.bytes += size
+        while self.bytes > self.max_bytes and len(self.lru) > 1:
+            self.evict(next(iter(self.lru)))
+        return entry
+
+    def evict(self, entry):
+        '''
+        Drop entry, and the tree nodes that only led to it.
+        '''
+        del self.lru[entry]
+        self.bytes -= entry.size
+        self.evictions += 1
+        # The first item of branch is (roots, start), the rest are
+        # (node, contents). Remove the leaf, then every node left empty.
+        for n in range(len(entry.branch) - 1, -1, -1):
+            parent, key = entry.branch[n]
+            children = parent if n == 0 else parent[1]
+            del children[key]
+            if n > 0 and parent[1]:
+                break
+
+    def info(self):
+        '''
+        Return the counters of the cache as a dictionary.
+        '''
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'entries': len(self.lru),
+                'bytes': self.bytes}
+
+
+def trace_all(L, new_grid, max_steps=None, cache=None):
 
-    change = Block('A', 1, 1, 1)  # block type, hit, vx, vy
+    '''
+    Returns every point passed by the lasers in L and by all the extra
+    lasers split off by C blocks.
 
-    # if position within block
-    in_grid = True
+    Every extra laser goes onto one worklist, which is traced until it
+    is empty. The lasers share one set of seen states, so a laser that
+    runs into the path of another one, or an extra laser that starts in
+    a state that was already traced, stops there instead of tracing the
+    same path twice.
 
-    # velocity positive?
-    vel_chk = True
+    **Parameters**
+        L: *list
+            Lazor positions and velocities.
 
-    # get current laser position
-    lz_cur = laser_pos[-1]
-    old_x = lz_cur[0]
-    old_y = lz_cur[1]
+        new_grid: *Board
+            modified intital grid
 
-    # check ahead for first step
-    # because laser reflects if its on an A block at the beginning
-    # (we don't want that)
-    in_grid = pos_chk(old_x + vx, old_y + vy, grid_w - 2, grid_h - 2)
+        max_steps: *int, optional
+            Passed on to path_loop.
 
-    vx1 = old_x + vx
-    vy1 = old_y + vy
+        cache: *TraceCache, optional
+            Reuse the paths traced on earlier boards where the cells they
+            looked at are the same. Every laser is then traced on its own
+            (cached paths have to be complete), and an extra laser is
+            only queued once per start state.
 
-    if in_grid:
-        # check on top/bottom (vert) or left/right (horiz) - x odd or even
-        if old_x % 2 == 0:   # if even, on horiz
-            old_loc = 0
-        else:
-            old_loc = 1
-        # if on the side of an A block at starting pt
-        if 'A' in new_grid[old_y][old_x] and old_loc == 0:
-            # if blank block for first pt, don't reflect
-            if new_grid[old_y][old_x + vx] == 'o':
-                new_x = old_x + vx
-                new_y = old_y + vy
-                laser_pos.append((new_x, new_y))
-                blk_type.append(new_grid[new_y][new_x])
-            elif new_grid[old_y + vy][old_x] == 'o' and old_loc == 1:
-                new_x = old_x + vx
-                new_y = old_y + vy
-                laser_pos.append((new_x, new_y))
-                blk_type.append(new_grid[new_y][new_x])
-
-        elif new_grid[vy1][vx1] == 'oo' or new_grid[vy1][vx1] == 'o' or\
-                new_grid[vy1][vx1] == 'xo' or new_grid[vy1][vx1] == 'ox':
-            new_x = vx1
-            new_y = vy1
-            laser_pos.append((new_x, new_y))
-            blk_type.append(new_grid[new_y][new_x])
-
-    while in_grid and vel_chk:
-
-        # get current laser position
-        lz_cur = laser_pos[-1]
-        old_x = lz_cur[0]
-        old_y = lz_cur[1]
-        blk_type.append(new_grid[old_y][old_x])
-
-        # check next hit top/bottom (0) or left/right (1) - x odd or even
-        if old_x % 2 == 0:   # if even, left/right
-            hit = 1
-        else:
-            hit = 0
-
-        # testing if the starting laser is b/t two As
-        # check are they within the grid
-        check_list = []
-        for chk in [
-                (old_y, old_x - 1), (old_y, old_x + 1),
-                (old_y - 1, old_x), (old_y + 1, old_x)]:
-
-            in_grid_chk = pos_chk(chk[0], chk[1], grid_w - 2, grid_h - 2)
-            check_list.append(in_grid_chk)
-
-        if all(check_list):
-            # if laser is stuck between 2 A blocks
-            if hit == 1:
-                if new_grid[old_y][old_x - 1] == 'A' and \
-                        new_grid[old_y][old_x + 1] == 'A':
-                    break
-            if hit == 0:
-                if new_grid[old_y - 1][old_x] == 'A' and \
-                        new_grid[old_y + 1][old_x] == 'A':
-                    break
+    **Returns**
+        result: *set
+            All the positions taken
+    '''
+    result = set()
+    if cache is not None:
+        queued = {tuple(i) for i in L}
+        worklist = collections.deque(queued)
+        while worklist:
+            start = worklist.popleft()
+            entry = cache.lookup(start, new_grid, max_steps)
+            if entry is None:
+                looked = {}
+                laser_pos, refract_list = path_loop([start], new_grid,
+                                                    max_steps, looked=looked)
+                entry = cache.store(start, new_grid, looked, laser_pos,
+                                    refract_list, max_steps)
+            result |= entry.points
+            for i in entry.spawns:
+                if i not in queued:
+                    queued.add(i)
+                    worklist.append(i)
+        return result
+    seen = set()
+    worklist = collections.deque(L)
+    while worklist:
+        laser_pos, refract_list = path_loop([worklist.popleft()], new_grid,
+                                            max_steps, seen)
+        result |= laser_pos
+        worklist.extend(refract_list)
+    return result
+
+
+def trace_mask(L, new_grid, targets=0, max_steps=None, cache=None):
 
-        # get the change and update new position
-        ch = change(new_grid[old_y][old_x], hit, vx, vy)
-        blk_type.append(new_grid[old_y][old_x])
-
-        if len(ch) == 2:  # A or B block
-            # update velocity
-            vx = ch[0]
-            vy = ch[1]
-            new_x = old_x + vx
-            new_y = old_y + vy
-
-            # need to check this with B block
-            if vx == 0 and vy == 0:
-                vel_chk = False
-
-        # will have two velocity pairs for C
-        # doesn't perform the refract action if prev. was also a C
-        elif len(ch) == 4 and 'C' not in blk_type[-3]:
-            vx = ch[0]
-            vy = ch[1]
-            extra_vx = ch[2]
-            extra_vy = ch[3]
-
-            new_x = old_x + vx
-            new_y = old_y + vy
-            extra_x = old_x + extra_vx
-            extra_y = old_y + extra_vy
-            # append into the extra refract list
-            refract_list.append([extra_x, extra_y, extra_vx, extra_vy])
+    '''
+    Like trace_all, but returns the points passed as a coverage mask
+    (see Board.bit) and stops as soon as every target is covered.
+
+    **Parameters**
+        L: *list
+            Lazor positions and velocities.
+
+        new_grid: *Board
+            modified intital grid
 
-        else:  # perform the len(ch) == 2 code
-            vx = ch[2]  # this is the extra vx value
-            vy = ch[3]
-            new_x = old_x + vx
-            new_y = old_y + vy
+        targets: *int, optional
+            Coverage mask of the points to hit. Tracing stops once
+            covered & targets == targets. With 0 every laser is traced
+            to the end.
 
-            # need to check this with B block
-            if vx == 0 and vy == 0:
-                vel_chk = False
+        max_steps: *int, optional
+            Stop every laser after this many steps, as a safety net.
 
-        # append into the position list for laser
-        laser_pos.append((new_x, new_y))
-        in_grid = pos_chk(
-            laser_pos[-1][0], laser_pos[-1][1], grid_w - 2, grid_h - 2)
-    # delete repeats
-    laser_pos_no_rep = list(set([x for x in laser_pos]))
-    # sort
-    laser_pos_sort = sorted(laser_pos_no_rep, key=lambda tup: (tup[0], tup[1]))
+        cache: *TraceCache, optional
+            Reuse paths traced on earlier boards, see trace_all.
 
-    return laser_pos_sort, refract_list
+    **Returns**
+        covered: *int
+            Coverage mask of the points passed.
+    '''
+    covered = 0
+    if cache is not None:
+        queued = {tuple(i) for i in L}
+        worklist = collections.deque(queued)
+        while worklist:
+            start = worklist.popleft()
+            entry = cache.lookup(start, new_grid, max_steps)
+            if entry is None:
+                looked = {}
+                laser_pos, refract_list = path_loop([start], new_grid,
+                                                    max_steps, looked=looked)
+                entry = cache.store(start, new_grid, looked, laser_pos,
+                                    refract_list, max_steps)
+            covered |= entry.mask
+            if targets and covered & targets == targets:
+                break
+            for i in entry.spawns:
+                if i not in queued:
+                    queued.add(i)
+                    worklist.append(i)
+        return covered
+
+    grid_w = new_grid.width * 2
+    grid_h = new_grid.height * 2
+    stride = grid_w + 1
+    jumps = new_grid.flight_table().jumps
+    seen = set()
+    worklist = collections.deque(L)
+    while worklist:
+        x, y, vx, vy = worklist.popleft()
+        steps = 0
+        while pos_chk(x, y, grid_w, grid_h):
+            state = (x, y, vx, vy)
+            if state in seen or steps == max_steps:
+                break
+            seen.add(state)
+            steps += 1
+            bit = 1 << (y * stride + x)
+            flight = jumps.get(state)
+            if flight is not None:
+                bit |= flight[2]
+            covered |= bit
+            # only worth comparing the masks when a target was hit
+            if bit & targets and covered & targets == targets:
+                return covered
+            if flight is not None:
+                end = flight[1]
+                if end is None:
+                    break
+                x, y = end[:2]
+                continue
+            velocity, extra, cells = laser_step(new_grid, x, y, vx, vy)
+            if extra is not None:
+                worklist.append(extra)
+            if velocity is None:
+                break
+            vx, vy = velocity
+            x += vx
+            y += vy
+    return covered
 
 
-def get_all_paths_taken(L, new_grid):
+def get_all_paths_taken(L, new_grid, max_steps=None, cache=None):
 
     '''
     contain the additional path from a C block split.
@@ -580,36 +970,23 @@ def get_all_paths_taken(L, new_grid):
             the laser starts, and the last two numbers are the
             x and y velocities.
 
-        new_grid: *list
+        new_grid: *Board
             modified intital grid
 
-    **Returns**
-        result: *list
-            A list of all the positions taken
-    '''
-
-    total_pos = []
-    a, b = path_loop(L, new_grid)
-    old_a = a
-    old_b = b
-    total_pos.append(old_a)
+        max_steps: *int, optional
+            Passed on to path_loop.
 
-    # while there are new paths from refract (C) blocks
-    while len(old_b) != 0:
-        new_a, new_b = path_loop(old_b, new_grid)
-        total_pos.append(new_a)
-        old_b = new_b
+        cache: *TraceCache, optional
+            Passed on to trace_all.
 
-    # join the refract nested list
-    joined_final = [j for i in total_pos for j in i]
-    # take out the negatives
-    result = [i for i in joined_final if i[0] >= 0 and i[1] >= 0]
-    result_no_rep = list(set([x for x in result]))
-    result_sort = sorted(result_no_rep, key=lambda tup: (tup[0], tup[1]))
-    return result_sort
+    **Returns**
+        result: *set
+            All the positions taken
+    '''
+    return trace_all(L[:1], new_grid, max_steps, cache)
 
 
-def grid_outcome(P, L, new_grid):
+def grid_outcome(P, L, new_grid, cache=None):
 
     '''
     Returns whether all the points have been hit by the laser
@@ -622,127 +999,2390 @@ def grid_outcome(P, L, new_grid):
             the laser starts, and the last two numbers are the
             x and y velocities.
 
-        new_grid: *list
+        new_grid: *Board
             modified intital grid
 
+        cache: *TraceCache, optional
+            Reuse paths traced on earlier boards, see trace_all.
+
     **Returns**
         all_touched: *bool
             whether all points were touched
     '''
-    # include all lasers (some files have multiple starting lasers)
-    joined_all = []
-    for i in L:
-        join = get_all_paths_taken([i], new_grid)
-        joined_all.append(join)
-
-    # make the intersection points into a list of tuples
-    intersect_pts = []
-    for pt in P:
-        intersect_pts.append(tuple(pt))
-    # flatten lists
-    joined_final = [j for i in joined_all for j in i]
-    # delete duplicates
-    no_repeat = list(set([x for x in joined_final]))
+    # include all lasers (some files have multiple starting lasers),
+    # sharing the work between them, until every target is hit
+    targets = new_grid.target_mask(P)
+    covered = trace_mask(L, new_grid, targets, cache=cache)
     # laser touched all intersect pts
-    all_touched = all(elem in no_repeat for elem in intersect_pts)
-    return all_touched
+    return covered & targets == targets
+
 
+def grid_coverage(P, L, new_grid, cache=None):
 
-def Solve_LAZOR(bfffile):
     '''
-    Function for adding all possible block elements to a random grid.
+    Returns how many of the points are hit by the lasers, for searches
+    that need to know how close a grid is to a solution.
 
     **Parameters**
-        bfffile: *string
-            The name of the directory of the desired bfffile.
+        P, L, new_grid, cache:
+            As for grid_outcome.
 
     **Returns**
-        Output_Grid: *list
-            The randomized grid with A, B, and C placed at random positions
-            where o used to be.
+        hit: *int
+            The number of points in P touched by a laser.
     '''
-    random.seed(1)
-    start = time.time()
-    P, A, B, C, L, Grid = ReadInbff(bfffile)
-    print('')
-    print('Initial Grid:')
-    print('')
-    print("\n".join(map(" ".join, Grid)))
-    wow_Grid = []
-    Possible_Pos = []
-    # Format Grid into Random_Grid for easier indexing.
-    for i in Grid:
-        wow_Grid.append(i.split(" "))
-    # Check for open positions
-    for r, row in enumerate(wow_Grid):
-        for c, i in enumerate(row):
-            if i == 'o':
-                Possible_Pos.append((r, c))
-    # Possible_Pos = random.sample(Possible_Pos, k=len(Possible_Pos))
-    # Increases the chance of a correct position to be hit if the numbere
-    # of permutations is too high to check in two minutes.
-    if len(Possible_Pos) > 19:
-        method = itertools.combinations
-    else:
-        method = itertools.permutations
-    # Based off the size of A+B+C, use a specific method
-    # to check positions
-    for i in method(Possible_Pos, A + B + C):
-        if method == itertools.combinations:
-            i = random.sample(i, k=len(i))
-        # Rewrite Random_Grid every solving iteration
-        Random_Grid = copy.deepcopy(wow_Grid)
-        Output_Grid = []
-        counter = 0
-        A_remain = A
-        B_remain = B
-        C_remain = C
-        # Place A B and C blocks until there are no more to place
-        while A_remain > 0 or B_remain > 0 or C_remain > 0:
-            # Only put blocks in places there is an o present.
-            # Keep placing A blocks until A blocks are depleted.
-            if A_remain > 0:
-                Random_Grid[i[counter][0]][i[counter][1]] = 'A'
-                A_remain -= 1
-            # After A blocks are depleted, place B blocks
-            # until B blocks are depleted.
-            elif B_remain > 0:
-                Random_Grid[i[counter][0]][i[counter][1]] = 'B'
-                B_remain -= 1
-            # After A and B blocks are depleted, place C blocks
-            # until C blocks are depleted.
-            elif C_remain > 0:
-                Random_Grid[i[counter][0]][i[counter][1]] = 'C'
-                C_remain -= 1
-            counter += 1
-        # Change coordinate system of Random_Grid to match Grid
-        for i in Random_Grid:
-            Output_Grid.append(" ".join(i))
-        # Change Output_Grid into a readable format for grid_outcome
-        new_grid = define_grid(Output_Grid)
-        # Check to see if the random grid we try works
-        if grid_outcome(P, L, new_grid):
-            print('Passed grid_outcome test!')
-            break
-    # Print the solution grid in the terminal
-    print('')
-    print('Solution:')
-    print('')
-    print("\n".join(map(" ".join, Output_Grid)))
-    # Write the solution grid into a text file
-    with open('Solution.txt', mode="w") as outfile:
-        outfile.write('Solution:\n')
-        outfile.write('\n')
-        for s in Output_Grid:
-            outfile.write("%s\n" % s)
-    # Print the amount of time this function took to run
-    end = time.time()
-    print('Time Elapsed: ' + str(end - start) + ' seconds')
-    return Output_Grid
+    targets = new_grid.target_mask(P)
+    covered = trace_mask(L, new_grid, targets, cache=cache)
+    return bin(covered & targets).count('1')
+
+
+class Outcome:
+    '''
+    grid_outcome prepared once for checking many boards of one puzzle,
+    rejecting the boards that fail as early as it can.
+
+    A board with a point walled in by A and B blocks (blocked_point) is
+    rejected before any laser is traced. After that the lasers are
+    traced one at a time, each time the one that could reach (see
+    Reachability) the most points not hit yet. Tracing stops once every
+    point is hit, and the board is rejected as soon as a point is
+    missing that none of the lasers left could reach.
+
+    The checks that need no tracing at all are also available on their
+    own, as walled, for searches that trace the lasers themselves.
+    '''
+
+    def __init__(self, P, A, B, C, L, Grid, stats=None, reach=None):
+        '''
+        **Parameters**
+            P, A, B, C, L, Grid:
+                The puzzle, as returned by ReadInbff.
+            stats: *SolveStats, optional
+                Counts the boards rejected.
+            reach: *Reachability, optional
+                The Reachability of the puzzle, if it was already made.
+        '''
+        if reach is None:
+            reach = Reachability(P, A, B, C, L, Grid)
+        board = define_grid(Grid)
+        self.stats = SolveStats() if stats is None else stats
+        self.L = [tuple(i) for i in L]
+        self.targets = board.target_mask(P)
+        # for each laser, the mask of the points it could reach
+        self.reachable = [0] * len(L)
+        for pt, sources in zip(P, reach.sources):
+            for n in sources:
+                self.reachable[n] |= board.bit(*pt)
+        self.unreachable = bool(reach.unreachable)
+        starts = {i[:2] for i in self.L}
+        self.sides = [near for pt, near in zip(P, target_sides(P, board))
+                      if (pt[0] + pt[1]) % 2 and
+                      (pt[0], pt[1]) not in starts]
+
+    def walled(self, cells):
+        '''
+        Returns whether a board fails without tracing it: a point no
+        laser can reach whatever the blocks, or a point walled in by A
+        and B blocks (blocked_point).
+
+        **Parameters**
+            cells: *bytearray
+                The cells of the board.
+        '''
+        return self.unreachable or blocked_point(self.sides, cells)
+
+    def __call__(self, board, cache=None):
+        '''
+        Returns whether the lasers hit every point on board, like
+        grid_outcome.
+
+        **Parameters**
+            board: *Board
+                A board of the puzzle, with blocks placed.
+            cache: *TraceCache, optional
+                Reuse paths traced on earlier boards, see trace_all.
+        '''
+        if self.walled(board.cells):
+            self.stats.rejected += 1
+            return False
+        reachable = self.reachable
+        left = list(range(len(self.L)))
+        covered = 0
+        while True:
+            missing = self.targets & ~covered
+            if not missing:
+                return True
+            within = 0
+            for n in left:
+                within |= reachable[n]
+            if missing & ~within:
+                # a missing point none of the lasers left can reach
+                self.stats.rejected += 1
+                return False
+            best = None
+            gain = 0
+            for n in left:
+                count = bin(missing & reachable[n]).count('1')
+                if count > gain:
+                    best, gain = n, count
+            left.remove(best)
+            covered |= trace_mask([self.L[best]], board, missing,
+                                  cache=cache)
+
+
+def batch_outcome(P, L, boards, stats=None):
+
+    '''
+    grid_outcome for many boards at once, using numpy. Every laser on
+    every board advances one step per iteration, so the Python overhead
+    is paid per step rather than per step and board.
+
+    As in trace_all, each board keeps the states its lasers have been
+    in and a laser stops on reaching one of them, so extra lasers from
+    C blocks are split off at most once per state and the number of
+    lasers stays bounded. Boards stop being traced as soon as all their
+    points are hit.
+
+    **Parameters**
+        P: *list
+            Points for laser to intersect
+
+        L: *list
+            Lazor positions and velocities.
+
+        boards: *array
+            (N, rows, cols) array of byte codes (int8), one board per
+            candidate, as in Board.cells.
+
+        stats: *SolveStats, optional
+            Counts the lasers, steps and splits traced on all boards.
+
+    **Returns**
+        all_touched: *numpy.ndarray
+            (N,) bool array, whether all points were touched on each
+            board.
+    '''
+    import numpy as np
+
+    boards = np.asarray(boards, dtype=np.int8)
+    n, rows, cols = boards.shape
+    grid_w = cols * 2
+    grid_h = rows * 2
+    # a point listed twice only needs to be hit once
+    P = list(dict.fromkeys(tuple(pt) for pt in P))
+    if not P:
+        return np.ones(n, dtype=bool)
+    # number of the target at each lattice point, or -1
+    target = np.full((grid_h + 1, grid_w + 1), -1, dtype=np.intp)
+    for t, (x, y) in enumerate(P):
+        if pos_chk(x, y, grid_w, grid_h):
+            target[y, x] = t
+    hit = np.zeros((n, len(P)), dtype=bool)
+    done = np.zeros(n, dtype=bool)
+    # seen states, numbered per board, point and direction
+    seen = np.zeros(n * (grid_h + 1) * (grid_w + 1) * 4, dtype=bool)
+    cells = boards.reshape(-1)
+
+    # one row per laser: board, x, y, vx, vy
+    L = np.asarray(L, dtype=np.intp).reshape(-1, 4)
+    b = np.repeat(np.arange(n), len(L))
+    x, y, vx, vy = (np.tile(L[:, i], n) for i in range(4))
+    if stats is not None:
+        stats.beams += b.size
+    while b.size:
+        # lasers that left the grid or whose board is already solved
+        keep = (x >= 0) & (x <= grid_w) & (y >= 0) & (y <= grid_h) & \
+            ~done[b]
+        state = ((b * (grid_h + 1) + y) * (grid_w + 1) + x) * 4 + \
+            (vx > 0) * 2 + (vy > 0)
+        keep &= ~seen[np.where(keep, state, 0)]
+        b, x, y, vx, vy, state = (i[keep] for i in
+                                  (b, x, y, vx, vy, state))
+        # two lasers in the same state: only one goes on
+        state, first = np.unique(state, return_index=True)
+        b, x, y, vx, vy = (i[first] for i in (b, x, y, vx, vy))
+        seen[state] = True
+        if stats is not None:
+            stats.steps += b.size
+
+        t = target[y, x]
+        on = t >= 0
+        hit[b[on], t[on]] = True
+        done = hit.all(axis=1)
+
+        # the block ahead, see Board.block_ahead
+        side = x % 2 == 0
+        c = np.where(side, (x + vx) // 2, x // 2)
+        r = np.where(side, y // 2, (y + vy) // 2)
+        inside = (c >= 0) & (c < cols) & (r >= 0) & (r < rows)
+        block = np.full(b.size, OPEN, dtype=np.int8)
+        block[inside] = cells[(b[inside] * rows + r[inside]) * cols +
+                              c[inside]]
+        # the reflected direction and the block on the other side of
+        # the point, see laser_step
+        rvx = np.where(side, -vx, vx)
+        rvy = np.where(side, vy, -vy)
+        c = np.where(side, (x + rvx) // 2, x // 2)
+        r = np.where(side, y // 2, (y + rvy) // 2)
+        inside = (c >= 0) & (c < cols) & (r >= 0) & (r < rows)
+        back = np.full(b.size, OPEN, dtype=np.int8)
+        back[inside] = cells[(b[inside] * rows + r[inside]) * cols +
+                             c[inside]]
+        stuck = (back == REFLECT) | (back == OPAQUE)
+
+        reflect = block == REFLECT
+        split = (block == REFRACT) & ~stuck
+        alive = (block != OPAQUE) & ~(reflect & stuck)
+        if stats is not None:
+            splits = int(np.count_nonzero(split))
+            stats.beams += splits
+            stats.splits += splits
+        vx = np.where(reflect, rvx, vx)
+        vy = np.where(reflect, rvy, vy)
+        # the extra lasers from C blocks join the others
+        b = np.concatenate((b[alive], b[split]))
+        x, vx = (np.concatenate((x[alive] + vx[alive],
+                                 x[split] + rvx[split])),
+                 np.concatenate((vx[alive], rvx[split])))
+        y, vy = (np.concatenate((y[alive] + vy[alive],
+                                 y[split] + rvy[split])),
+                 np.concatenate((vy[alive], rvy[split])))
+    return done
+
+
+class SolveStats:
+    '''
+    Counters collected while solving one puzzle, and optionally the time
+    spent in each stage of the solve.
+    '''
+
+    def __init__(self, timing=False):
+        '''
+        **Parameters**
+            timing: *bool
+                Whether to time the stages. The counters are always kept,
+                the timing costs a little and is off by default.
+        '''
+        # boards (or branches of the backtracking search) that were checked
+        self.candidates = 0
+        # lasers and extra lasers from C blocks that were traced
+        self.beams = 0
+        # laser steps traced
+        self.steps = 0
+        # extra lasers split off by C blocks
+        self.splits = 0
+        # candidates skipped because they would repeat a failed trace
+        self.skipped = 0
+        # candidates found not to be a solution, skipped ones included
+        self.rejected = 0
+        # stage -> seconds spent in it
+        self.times = {}
+        self.timing = timing
+
+    def timed(self, func, stage):
+        '''
+        Return func, timed under stage if timing is on. Used to wrap the
+        functions the search calls over and over, so there is no cost at
+        all with timing off.
+        '''
+        if not self.timing:
+            return func
+        times = self.times
+        clock = time.perf_counter
+
+        def timed_func(*args):
+            start = clock()
+            try:
+                return func(*args)
+            finally:
+                times[stage] = times.get(stage, 0) + clock() - start
+        return timed_func
+
+    @contextlib.contextmanager
+    def stage(self, stage):
+        '''
+        Time the body of a with statement under stage, if timing is on.
+        '''
+        if not self.timing:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[stage] = self.times.get(stage, 0) + \
+                time.perf_counter() - start
+
+    def merge(self, other):
+        '''
+        Add the counters and times of other, a dictionary from as_dict,
+        to these ones.
+        '''
+        for name, value in other.items():
+            if name == 'times':
+                for stage, t in value.items():
+                    self.times[stage] = self.times.get(stage, 0) + t
+            elif isinstance(value, (int, float)) and \
+                    not isinstance(value, bool):
+                setattr(self, name, getattr(self, name, 0) + value)
+
+    def as_dict(self):
+        '''
+        Return the counters and times as a dictionary.
+        '''
+        result = dict(vars(self))
+        del result['timing']
+        result['times'] = dict(self.times)
+        return result
+
+
+def puzzle_key(P, A, B, C, L, Grid):
+    '''
+    Return a hash of a puzzle, as returned by ReadInbff. Puzzles that
+    only differ in the order of their points or lasers, or in the
+    spacing of the grid, get the same hash.
+    '''
+    import hashlib
+    import json
+
+    canonical = [sorted(list(pt) for pt in P), A, B, C,
+                 sorted(list(i) for i in L), [i.split() for i in Grid]]
+    return hashlib.sha256(json.dumps(canonical).encode()).hexdigest()
+
+
+class Checkpoint:
+    '''
+    Small file that a long search writes its position to every now and
+    then, so a solve that gets killed can carry on where it was.
+
+    The file is written to a temporary file first and moved over the
+    old one with os.replace, so it is always either the old or the new
+    checkpoint, never half written. It records a hash of the puzzle and
+    which search wrote it, and is ignored when either does not match.
+    '''
+    # Bumped whenever the positions saved by the searches change meaning.
+    VERSION = 2
+
+    def __init__(self, filename, interval=60.0):
+        '''
+        **Parameters**
+            filename: *string
+                The checkpoint file.
+            interval: *float
+                Seconds between two writes of the checkpoint.
+        '''
+        self.filename = filename
+        self.interval = interval
+        self.puzzle = None
+        self.search = None
+        # why the file was not resumed from, or None
+        self.rejected = None
+        self.last = time.monotonic()
+
+    def resume(self, puzzle, search, stats):
+        '''
+        Start checkpointing a search, and return the position saved by
+        an earlier run of the same search of the same puzzle.
+
+        **Parameters**
+            puzzle: *tuple
+                The puzzle, as returned by ReadInbff.
+            search: *list
+                Names the search and its options, for example
+                ['enumerate', chunk]. The position is only valid for
+                the same search.
+            stats: *SolveStats
+                Gets the counters saved with the position added to it.
+
+        **Returns**
+            position: *object or None
+                The saved position, None to start from the beginning.
+        '''
+        import json
+
+        self.puzzle = puzzle_key(*puzzle)
+        # as it reads back from the file, tuples turned into lists
+        search = json.loads(json.dumps(search))
+        self.search = search
+        self.last = time.monotonic()
+        self.rejected = None
+        try:
+            with open(self.filename) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            self.rejected = 'unreadable: %s' % e
+            return None
+        if not isinstance(state, dict) or \
+                state.get('version') != self.VERSION:
+            self.rejected = 'written by another version'
+        elif state.get('puzzle') != self.puzzle:
+            self.rejected = 'written for another puzzle'
+        elif state.get('search') != search:
+            self.rejected = 'written by another search'
+        if self.rejected is not None:
+            return None
+        stats.merge(state.get('stats', {}))
+        return state.get('position')
+
+    def due(self):
+        '''
+        Returns whether it is time to save the position again.
+        '''
+        return time.monotonic() - self.last >= self.interval
+
+    def save(self, position, stats):
+        '''
+        Write position and the counters of stats to the file.
+        '''
+        import json
+        import tempfile
+
+        state = {'version': self.VERSION, 'puzzle': self.puzzle,
+                 'search': self.search, 'position': position,
+                 'stats': stats.as_dict(), 'time': time.time()}
+        folder = os.path.dirname(os.path.abspath(self.filename))
+        fd, temp = tempfile.mkstemp(dir=folder, prefix='.checkpoint')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(state, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp, self.filename)
+        except BaseException:
+            os.unlink(temp)
+            raise
+        self.last = time.monotonic()
+
+    def clear(self):
+        '''
+        Remove the file once the search is over.
+        '''
+        try:
+            os.remove(self.filename)
+        except FileNotFoundError:
+            pass
+
+
+def check_solution(P, A, B, C, L, Grid, Output_Grid):
+    '''
+    Returns whether Output_Grid is a solution of the puzzle: it only
+    adds the A, B and C blocks of the puzzle on open cells of Grid,
+    and the lasers hit every point.
+    '''
+    rows = [i.split() for i in Grid]
+    solved = [i.split() for i in Output_Grid]
+    if [len(i) for i in rows] != [len(i) for i in solved]:
+        return False
+    placed = {'A': 0, 'B': 0, 'C': 0, 'o': 0}
+    for row, solved_row in zip(rows, solved):
+        for cell, solved_cell in zip(row, solved_row):
+            if cell == 'o' and solved_cell in placed:
+                placed[solved_cell] += 1
+            elif cell != solved_cell:
+                return False
+    if (placed['A'], placed['B'], placed['C']) != (A, B, C):
+        return False
+    return grid_outcome(P, L, define_grid(Output_Grid))
+
+
+class SolutionCache:
+    '''
+    Solutions kept on disk in an SQLite database, so a puzzle that was
+    solved before, by any process, is not searched again.
+
+    Puzzles are found by puzzle_key, a hash of the parsed puzzle, so
+    files that only differ in comments or spacing share an entry. Every
+    solution read back is checked with check_solution before it is
+    returned; one that fails is dropped. Only solutions are kept, as
+    there is no cheap way to check that a puzzle has none.
+
+    Every call opens its own connection and SQLite locks the file, so
+    several processes can use the same cache at once.
+    '''
+
+    def __init__(self, filename, max_entries=100000, timeout=30.0):
+        '''
+        **Parameters**
+            filename: *string
+                The database file. It is created if it does not exist.
+            max_entries: *int
+                The least recently used solutions are evicted beyond it.
+            timeout: *float
+                Seconds to wait for another process holding the lock.
+        '''
+        self.filename = filename
+        self.max_entries = max_entries
+        self.timeout = timeout
+        with self.connect() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS solutions ('
+                       'key TEXT PRIMARY KEY, solution TEXT NOT NULL, '
+                       'used REAL NOT NULL)')
+            db.execute('CREATE INDEX IF NOT EXISTS solutions_used '
+                       'ON solutions (used)')
+
+    @contextlib.contextmanager
+    def connect(self):
+        '''
+        Open the database for a with statement, committing at the end.
+        '''
+        import sqlite3
+
+        db = sqlite3.connect(self.filename, timeout=self.timeout)
+        try:
+            # readers do not block the writer, nor the writer the readers
+            db.execute('PRAGMA journal_mode=WAL')
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def get(self, puzzle):
+        '''
+        Return the cached solution of puzzle (as returned by ReadInbff),
+        or None.
+        '''
+        import json
+
+        key = puzzle_key(*puzzle)
+        with self.connect() as db:
+            row = db.execute('SELECT solution FROM solutions WHERE key = ?',
+                             (key,)).fetchone()
+            if row is None:
+                return None
+            Output_Grid = json.loads(row[0])
+            if not check_solution(*puzzle, Output_Grid):
+                db.execute('DELETE FROM solutions WHERE key = ?', (key,))
+                return None
+            db.execute('UPDATE solutions SET used = ? WHERE key = ?',
+                       (time.time(), key))
+        return Output_Grid
+
+    def put(self, puzzle, Output_Grid):
+        '''
+        Store the solution of puzzle, evicting the least recently used
+        solutions if the cache is full.
+        '''
+        import json
+
+        with self.connect() as db:
+            db.execute('INSERT OR REPLACE INTO solutions VALUES (?, ?, ?)',
+                       (puzzle_key(*puzzle), json.dumps(Output_Grid),
+                        time.time()))
+            db.execute('DELETE FROM solutions WHERE key IN (SELECT key '
+                       'FROM solutions ORDER BY used DESC LIMIT -1 '
+                       'OFFSET ?)', (self.max_entries,))
+
+    def __len__(self):
+        with self.connect() as db:
+            return db.execute('SELECT COUNT(*) FROM solutions').fetchone()[0]
+
+
+class Beam:
+    '''
+    The traced path of one laser, or of one extra laser split off by a
+    C block, kept so it can be traced again from the middle.
+    '''
+    __slots__ = ('states', 'seen', 'touched', 'spawns', 'refs', 'epoch')
+
+    def __init__(self, start, epoch=0):
+        # position and velocity of the laser at every point it passed
+        self.states = [start]
+        # the same states as a set, to notice the laser going in a loop
+        self.seen = {start}
+        # index of every cell looked at -> first step that looked at it
+        self.touched = {}
+        # (step, Beam) of every extra laser split off at a C block
+        self.spawns = []
+        # number of lasers and spawns that lead to this Beam
+        self.refs = 1
+        # the last Tracer.epoch this Beam was visited in
+        self.epoch = epoch
+
+
+class Tracer:
+    '''
+    Traces every laser on a board and remembers, for each laser and each
+    extra laser from a C block, which cells its path looked at and when.
+    When a few cells change, only the paths that looked at them are
+    traced again, starting at the first step that looked at a changed
+    cell. Everything before that step is reused as is.
+
+    Extra lasers that start in the same state take the same path, so
+    there is only one Beam per start state, shared by every C block
+    that splits it off. Beams count the spawns leading to them and are
+    forgotten once none does. Spawns can go round in a circle, which
+    counting alone never frees, so after an update that left such a
+    circle possible every Beam the lasers no longer lead to is swept.
+    '''
+
+    def __init__(self, board, L, stats=None, max_steps=None):
+        '''
+        **Parameters**
+            board: *Board
+                modified intital grid. The Tracer keeps using this board,
+                so it sees every block written into it.
+            L: *list
+                Lazor positions and velocities.
+            stats: *SolveStats, optional
+                Counts the beams, steps and splits traced.
+            max_steps: *int, optional
+                Cut every path off after this many steps, as a safety net.
+                Paths also stop when they start going round in a loop.
+        '''
+        self.board = board
+        self.max_steps = max_steps
+        # point -> number of paths passing it
+        self.hits = {}
+        self.stats = SolveStats() if stats is None else stats
+        # start state -> the Beam starting there
+        self.starts = {}
+        # bumped by every update and walk, to visit each Beam once
+        self.epoch = 0
+        # set when a Beam lost a spawn leading to it but not the last
+        self.garbage = False
+        # reused by walk for the beams still to visit
+        self.todo = []
+        # reused by looked for the cells looked at, and for each cell
+        # the epoch of the walk that last listed it
+        self.order = []
+        self.listed = [0] * len(board.cells)
+        # the cells changed, while an update is running
+        self.changed = None
+        self.beams = [self.new_beam(i) for i in L]
+
+    def new_beam(self, start):
+        '''
+        Return the Beam of a laser from start = [x, y, vx, vy], tracing
+        it if there is none yet, or None if it starts outside the grid.
+        '''
+        x, y = start[0], start[1]
+        if not pos_chk(x, y, self.board.width * 2, self.board.height * 2):
+            return None
+        start = tuple(start)
+        beam = self.starts.get(start)
+        if beam is not None:
+            beam.refs += 1
+            if self.changed is not None and beam.epoch != self.epoch:
+                # found again by a path traced in this update, which is
+                # not visited by it: bring the Beam up to date here
+                self.update_beam(beam, self.changed)
+            return beam
+        # traced on the board as it is now, so up to date in this update
+        beam = Beam(start, self.epoch)
+        self.starts[start] = beam
+        self.stats.beams += 1
+        self.hits[(x, y)] = self.hits.get((x, y), 0) + 1
+        self.run(beam)
+        return beam
+
+    def run(self, beam):
+        '''
+        Continue tracing beam from its last state until it stops or
+        leaves the grid.
+        '''
+        board = self.board
+        hits = self.hits
+        grid_w = board.width * 2
+        grid_h = board.height * 2
+        stats = self.stats
+        jumps = board.flight_table().jumps
+        x, y, vx, vy = beam.states[-1]
+        while True:
+            flight = jumps.get((x, y, vx, vy))
+            if flight is not None:
+                # Only 'x' cells ahead, which never change, so the
+                # stretch up to the next interaction point is added at
+                # once and nothing is touched. Only that point is kept
+                # in seen; a loop always runs through one.
+                passed, end, mask = flight
+                if end is not None and end in beam.seen:
+                    passed = passed[:-1]
+                beam.states.extend(passed)
+                for i in passed:
+                    hits[i[:2]] = hits.get(i[:2], 0) + 1
+                if end is None or not passed or passed[-1] is not end:
+                    break
+                beam.seen.add(end)
+                if self.max_steps is not None and \
+                        len(beam.states) >= self.max_steps:
+                    break
+                x, y = end[:2]
+                continue
+            k = len(beam.states) - 1
+            stats.steps += 1
+            velocity, extra, looked = laser_step(board, x, y, vx, vy)
+            for i in looked:
+                if i not in beam.touched:
+                    beam.touched[i] = k
+            if extra is not None:
+                stats.splits += 1
+                child = self.new_beam(extra)
+                if child is not None:
+                    beam.spawns.append((k, child))
+            if velocity is None:
+                break
+            vx, vy = velocity
+            x += vx
+            y += vy
+            if not pos_chk(x, y, grid_w, grid_h):
+                break
+            state = (x, y, vx, vy)
+            # back in a state it has been in: it would only loop again
+            if state in beam.seen or len(beam.states) == self.max_steps:
+                break
+            beam.states.append(state)
+            beam.seen.add(state)
+            hits[(x, y)] = hits.get((x, y), 0) + 1
+
+    def drop(self, beam, k):
+        '''
+        Forget everything beam did after reaching state k, including the
+        extra lasers split off at or after step k.
+        '''
+        hits = self.hits
+        states = beam.states
+        seen = beam.seen
+        for j in range(k + 1, len(states)):
+            state = states[j]
+            hits[state[0], state[1]] -= 1
+            seen.discard(state)
+        del states[k + 1:]
+        # touched and spawns are in step order, so what goes is at the end
+        touched = beam.touched
+        while touched:
+            i, s = touched.popitem()
+            if s < k:
+                touched[i] = s
+                break
+        spawns = beam.spawns
+        while spawns and spawns[-1][0] >= k:
+            self.release(spawns.pop()[1])
+
+    def release(self, beam):
+        '''
+        Take away one of the spawns leading to beam.
+        '''
+        beam.refs -= 1
+        if beam.refs == 0:
+            self.forget(beam)
+        elif beam.refs > 0:
+            # it may only be left in a circle of spawns
+            self.garbage = True
+
+    def forget(self, beam):
+        '''
+        Forget a whole beam and let go of every extra laser split off
+        from it.
+        '''
+        del self.starts[beam.states[0]]
+        self.drop(beam, 0)
+        x, y = beam.states[0][:2]
+        self.hits[(x, y)] -= 1
+
+    def sweep(self):
+        '''
+        Forget every Beam that the lasers no longer lead to.
+        '''
+        self.garbage = False
+        for beam in self.walk():
+            pass
+        epoch = self.epoch
+        lost = [beam for beam in self.starts.values() if beam.epoch != epoch]
+        hits = self.hits
+        for beam in lost:
+            del self.starts[beam.states[0]]
+            for state in beam.states:
+                hits[state[0], state[1]] -= 1
+            for s, child in beam.spawns:
+                if child.epoch == epoch:
+                    child.refs -= 1
+            # never looked at again; only cut loose from the others
+            beam.refs = 0
+            del beam.spawns[:]
+
+    def update(self, changed):
+        '''
+        Bring every path up to date after the cells in changed were
+        rewritten on the board.
+
+        **Parameters**
+            changed: *sequence
+                Indices of the cells that changed. It is read once per
+                path, so it can be a buffer the caller reuses.
+        '''
+        self.epoch += 1
+        self.changed = changed
+        for beam in self.beams:
+            if beam is not None and beam.epoch != self.epoch:
+                self.update_beam(beam, changed)
+        self.changed = None
+        if self.garbage:
+            self.sweep()
+
+    def update_beam(self, beam, changed):
+        beam.epoch = self.epoch
+        touched = beam.touched
+        k = -1
+        for i in changed:
+            s = touched.get(i, -1)
+            if s >= 0 and (k < 0 or s < k):
+                k = s
+        if k >= 0:
+            self.drop(beam, k)
+            self.run(beam)
+        # Extra lasers split off before step k are still there but may
+        # have looked at a changed cell themselves, and so may the
+        # shared ones run found again. The ones it traced are new.
+        spawns = beam.spawns
+        for j in range(len(spawns)):
+            child = spawns[j][1]
+            if child.epoch != self.epoch:
+                self.update_beam(child, changed)
+
+    def walk(self):
+        '''
+        Yield every Beam the lasers lead to once: the lasers first,
+        then the extra lasers split off from them, level by level.
+        '''
+        self.epoch += 1
+        epoch = self.epoch
+        todo = self.todo
+        todo.clear()
+        for beam in self.beams:
+            if beam is not None and beam.epoch != epoch:
+                beam.epoch = epoch
+                todo.append(beam)
+        for beam in todo:
+            yield beam
+            for s, child in beam.spawns:
+                if child.epoch != epoch:
+                    child.epoch = epoch
+                    todo.append(child)
+
+    def all_touched(self, P):
+        '''
+        Returns whether all the points P are hit by a laser.
+        '''
+        hits = self.hits
+        for pt in P:
+            if not hits.get(tuple(pt)):
+                return False
+        return True
+
+    def looked(self, keep=None):
+        '''
+        Returns the cells looked at by every path, each once. A path
+        only looks at a cell after it has looked at every cell that
+        decides it gets there, and an extra laser comes after the path
+        it was split off from, so the cell at any place in this order
+        only depends on what is in the cells before it.
+
+        The list is reused by the next call, so nothing is allocated
+        per call once it has grown.
+
+        **Parameters**
+            keep: *bytearray, optional
+                Only list the cells i where keep[i] is set.
+        '''
+        order = self.order
+        order.clear()
+        listed = self.listed
+        for beam in self.walk():
+            # walk bumped the epoch, so no cell is listed in it yet
+            epoch = self.epoch
+            for i in beam.touched:
+                if listed[i] != epoch and (keep is None or keep[i]):
+                    listed[i] = epoch
+                    order.append(i)
+        return order
+
+
+class FailedTraces:
+    '''
+    Remembers the candidates that failed by what their lasers saw, so a
+    candidate that would only repeat one of those traces is skipped
+    without tracing it.
+
+    The traces are kept in a trie: every node names the next cell the
+    lasers look at and branches on the block in that cell, so boards
+    that only differ in cells no laser looked at end in the same leaf.
+    The lasers of a candidate that reaches a leaf look at exactly the
+    cells of the failed candidate and find the same blocks there, so
+    they can only take the same paths.
+    '''
+
+    # the block in the cell of a leaf; a leaf has no cell to look at
+    FAILED = None
+
+    def __init__(self, max_nodes=1 << 18):
+        '''
+        **Parameters**
+            max_nodes: *int
+                The trie is emptied and started again when it grows past
+                this many nodes, which bounds the memory to a few tens
+                of MiB.
+        '''
+        self.max_nodes = max_nodes
+        # [cell to look at next, {block in that cell: next node}]
+        self.root = None
+        self.nodes = 0
+        self.clears = 0
+
+    def known(self, cells):
+        '''
+        Returns whether a candidate repeats a failed trace.
+
+        **Parameters**
+            cells: *bytearray
+                The cells of the candidate board.
+        '''
+        node = self.root
+        while node is not None:
+            cell, branches = node
+            if cell is self.FAILED:
+                return True
+            node = branches.get(cells[cell])
+        return False
+
+    def add(self, looked, cells):
+        '''
+        Remember a failed trace.
+
+        **Parameters**
+            looked: *list
+                The cells the lasers looked at that may hold a block, in
+                the order of Tracer.looked.
+            cells: *bytearray
+                The cells of the board, with the candidate's blocks in.
+        '''
+        if self.nodes + len(looked) >= self.max_nodes:
+            self.root = None
+            self.nodes = 0
+            self.clears += 1
+        if self.root is None:
+            self.root = [looked[0] if looked else self.FAILED, {}]
+            self.nodes += 1
+        node = self.root
+        for k, i in enumerate(looked):
+            branches = node[1]
+            node = branches.get(cells[i])
+            if node is None:
+                node = [looked[k + 1] if k + 1 < len(looked) else
+                        self.FAILED, {}]
+                branches[cells[i]] = node
+                self.nodes += 1
+
+
+def multiset_placements(Possible_Pos, A, B, C, first=None):
+    '''
+    Yield every distinct way of putting the A reflect, B opaque and C
+    refract blocks into the open positions. Blocks of the same type are
+    interchangeable, so each typed board is generated exactly once instead
+    of A! * B! * C! times like itertools.permutations would.
+
+    **Parameters**
+        Possible_Pos: *list
+            The positions where blocks are allowed.
+        A: *int
+            Number of Reflect Blocks
+        B: *int
+            Number of Opaque Blocks
+        C: *int
+            Number of Refract Blocks
+        first: *int, optional
+            Only yield the placements whose first block (the first A
+            block, or the first B or C block if there are no A blocks)
+            is at Possible_Pos[first].
+
+    **Returns**
+        placement: *generator
+            Yields tuples (A_pos, B_pos, C_pos), each a tuple of the
+            positions holding that block type.
+    '''
+    cells = list(Possible_Pos)
+    if A + B + C > len(cells):
+        return
+
+    def choose(cells, k, fix):
+        # combinations of k cells, the first one being fix if it is given
+        if fix is None or k == 0:
+            return itertools.combinations(cells, k)
+        later = cells[cells.index(fix) + 1:]
+        return ((fix,) + i for i in itertools.combinations(later, k - 1))
+
+    fix = None if first is None else cells[first]
+    # Choose the A cells first, then the B cells out of whatever is left,
+    # and finally the C cells out of the rest. Every choice is a
+    # combination, so the order inside one block type never matters.
+    # The combinations are of the positions themselves, so the tuples
+    # itertools makes are yielded as they are.
+    for a in choose(cells, A, fix):
+        a_set = set(a)
+        rest = [i for i in cells if i not in a_set]
+        for b in choose(rest, B, fix if A == 0 else None):
+            b_set = set(b)
+            rest_b = [i for i in rest if i not in b_set]
+            for c in choose(rest_b, C, fix if A + B == 0 else None):
+                yield a, b, c
+
+
+class Reachability:
+    '''
+    What the lasers of a puzzle could ever reach, whatever blocks are
+    placed.
+
+    A laser in front of an open cell may go straight on (nothing there,
+    or a C block), turn (an A or C block) or stop (a B block). Following
+    every one of these choices from every laser start gives all the
+    states any laser can be in on any board. The open cells that these
+    states run into, or that decide whether a reflected laser is stuck,
+    are the only ones where a block can change a path. The others form
+    a don't-care bucket: blocks that go there never matter, so it makes
+    no difference which of those cells they are on.
+    '''
+
+    def __init__(self, P, A, B, C, L, Grid):
+        '''
+        **Parameters**
+            P, A, B, C, L, Grid:
+                The puzzle, as returned by ReadInbff.
+        '''
+        board = define_grid(Grid)
+        cells = board.cells
+        grid_w = board.width * 2
+        grid_h = board.height * 2
+        relevant = set()
+        # the points each laser could reach
+        reached = []
+        for start in L:
+            points = set()
+            seen = set()
+            todo = [tuple(start)]
+            while todo:
+                state = todo.pop()
+                x, y, vx, vy = state
+                if state in seen or not pos_chk(x, y, grid_w, grid_h):
+                    continue
+                seen.add(state)
+                points.add((x, y))
+                idx = board.block_ahead(x, y, vx, vy)
+                block = NO_BLOCK if idx < 0 else cells[idx]
+                if block == OPEN:
+                    relevant.add(idx)
+                if block in (NO_BLOCK, OPEN, REFRACT):
+                    todo.append((x + vx, y + vy, vx, vy))
+                if block in (OPEN, REFLECT, REFRACT):
+                    rvx, rvy = Block.Reflect(1 if x % 2 == 0 else 0, vx, vy)
+                    back = board.block_ahead(x, y, rvx, rvy)
+                    if back >= 0 and cells[back] == OPEN:
+                        relevant.add(back)
+                    todo.append((x + rvx, y + rvy, rvx, rvy))
+            reached.append(points)
+        open_cells = [i for i, cell in enumerate(cells) if cell == OPEN]
+        # open cells where a block can change a laser path, in order
+        self.cells = [i for i in open_cells if i in relevant]
+        # open cells no laser can ever reach
+        self.bucket = [i for i in open_cells if i not in relevant]
+        # for every point in P, the indices in L of the lasers that
+        # could reach it
+        self.sources = [[n for n, points in enumerate(reached)
+                         if tuple(pt) in points] for pt in P]
+        # the points no laser can reach: the puzzle has no solution
+        self.unreachable = [tuple(pt) for pt, n in zip(P, self.sources)
+                            if not n]
+        self.counts = (A, B, C)
+        # the number of boards a brute force search tries with and
+        # without the bucket
+        self.space = self.boards(len(open_cells), 0)
+        self.reduced = self.boards(len(self.cells), len(self.bucket))
+
+    def boards(self, n, room):
+        '''
+        Returns the number of distinct boards with the blocks on n
+        cells, where up to room blocks may be left out (for the bucket).
+        '''
+        total = 0
+        for a, b, c in self.splits(room):
+            if a + b + c <= n:
+                total += math.comb(n, a) * math.comb(n - a, b) * \
+                    math.comb(n - a - b, c)
+        return total
+
+    def splits(self, room=None):
+        '''
+        Returns the numbers (a, b, c) of A, B and C blocks that can go on
+        the reachable cells, the rest fitting in the bucket. The most
+        blocks come first.
+        '''
+        if room is None:
+            room = len(self.bucket)
+        A, B, C = self.counts
+        return [(a, b, c) for a in range(A, -1, -1)
+                for b in range(B, -1, -1) for c in range(C, -1, -1)
+                if A - a + B - b + C - c <= room]
+
+    @property
+    def shrink(self):
+        '''
+        How many times fewer boards there are to try thanks to the
+        bucket.
+        '''
+        if not self.reduced:
+            return 1.0
+        return self.space / self.reduced
+
+    def placements(self, first=None):
+        '''
+        Yield the placements of multiset_placements on the reachable
+        cells, leaving the blocks that are not placed for the bucket.
+
+        **Parameters**
+            first: *int, optional
+                Only yield the placements whose first block is on
+                cells[first] (see multiset_placements), or with -1 the
+                one placement that puts every block in the bucket.
+
+        **Returns**
+            placement: *generator
+                Yields tuples (A_pos, B_pos, C_pos). Boards that only
+                differ in the bucket are only yielded once.
+        '''
+        splits = self.splits()
+        keys = range(len(self.cells)) if first is None else [first]
+        for k in keys:
+            if k < 0:
+                continue
+            for a, b, c in splits:
+                if a + b + c:
+                    yield from multiset_placements(self.cells, a, b, c,
+                                                   first=k)
+        if (first is None or first == -1) and (0, 0, 0) in splits:
+            yield (), (), ()
+
+    def leftovers(self, A_pos, B_pos, C_pos):
+        '''
+        Yield every distinct way of putting the blocks that placement
+        left out into the bucket, as (A_pos, B_pos, C_pos).
+        '''
+        A, B, C = self.counts
+        return multiset_placements(self.bucket, A - len(A_pos),
+                                   B - len(B_pos), C - len(C_pos))
+
+
+def enumerate_solutions(P, A, B, C, L, Grid, chunk=None, stop=None,
+                        stats=None, checkpoint=None):
+    '''
+    Brute force search. Tries every distinct arrangement of the blocks
+    and yields the grids where the lasers hit every point.
+
+    **Parameters**
+        P, A, B, C, L, Grid:
+            The puzzle, as returned by ReadInbff.
+        chunk: *int, optional
+            Only search the part of the placements given by one of the
+            keys from enumerate_chunks.
+        stop: *callable, optional
+            Polled now and then. The search gives up once it returns True.
+        stats: *SolveStats, optional
+            Counts the candidates that were checked.
+        checkpoint: *Checkpoint, optional
+            Saves the number of placements checked now and then, and
+            carries on from the saved number.
+
+    **Returns**
+        Output_Grid: *generator
+            Yields every solved grid, in the same format as Grid.
+    '''
+    if stats is None:
+        stats = SolveStats()
+    skip = 0
+    if checkpoint is not None:
+        skip = checkpoint.resume((P, A, B, C, L, Grid),
+                                 ['enumerate', chunk], stats) or 0
+    with stats.stage('setup'):
+        # Build the board once. Every candidate only writes the bytes of
+        # the cells it fills and clears them again afterwards.
+        board = define_grid(Grid)
+        # Only cells some laser could reach get blocks tried on them.
+        reach = Reachability(P, A, B, C, L, Grid)
+        # Trace the lasers once on the empty board. After that only the
+        # paths that looked at a cell that changed are traced again.
+        tracer = Tracer(board, L, stats)
+    update = stats.timed(tracer.update, 'trace')
+    all_touched = stats.timed(tracer.all_touched, 'check')
+    if reach.unreachable:
+        return
+    # Blocks the lasers never looked at can not have made a candidate
+    # fail, so moving only those blocks around can not make it work.
+    failed = FailedTraces()
+    movable = bytearray(len(board.cells))
+    for i in reach.cells:
+        movable[i] = 1
+    # rejects the boards that fail without tracing them
+    outcome = Outcome(P, A, B, C, L, Grid, stats, reach)
+    P = [tuple(pt) for pt in P]
+    cells = board.cells
+    # The candidate is written into its own copy of the cells, so it can
+    # be looked up in failed without touching the traced board.
+    wanted = bytearray(cells)
+    # blocks of the last candidate, and of the last one that was traced
+    last = traced = ((), (), ())
+    # buffer for the cells that differ between the board and wanted
+    changed = []
+    # Check every distinct arrangement of the blocks exactly once.
+    placements = itertools.islice(reach.placements(first=chunk), skip, None)
+    for n, placed in enumerate(placements, skip):
+        if n % 1000 == 0:
+            if stop is not None and stop():
+                if checkpoint is not None:
+                    checkpoint.save(n, stats)
+                return
+            if checkpoint is not None and checkpoint.due():
+                checkpoint.save(n, stats)
+        stats.candidates += 1
+        # Take the last candidate's blocks out of wanted and put this
+        # one's in.
+        for positions in last:
+            for i in positions:
+                wanted[i] = OPEN
+        for block, positions in zip((REFLECT, OPAQUE, REFRACT), placed):
+            for i in positions:
+                wanted[i] = block
+        last = placed
+        if failed.known(wanted):
+            stats.skipped += 1
+            stats.rejected += 1
+            continue
+        # a point walled in by A and B blocks: no need to trace
+        if outcome.walled(wanted):
+            stats.rejected += 1
+            continue
+        # Only cells of the last traced candidate or of this one can
+        # differ. Each is copied over once, so it is listed once.
+        changed.clear()
+        for positions in itertools.chain(traced, placed):
+            for i in positions:
+                if cells[i] != wanted[i]:
+                    cells[i] = wanted[i]
+                    changed.append(i)
+        traced = placed
+        update(changed)
+        # Check to see if the grid we try works
+        if all_touched(P):
+            # No laser looks at the bucket, so wherever the blocks left
+            # out go there, the grid works.
+            yield from leftover_grids(board, reach, *placed)
+        else:
+            stats.rejected += 1
+            failed.add(tracer.looked(movable), cells)
+
+
+def leftover_grids(board, reach, A_pos, B_pos, C_pos):
+    '''
+    Yield board, as in Grid, with every arrangement of the blocks left
+    out of a placement (see Reachability.placements) in the bucket.
+    '''
+    cells = board.cells
+    for spare in reach.leftovers(A_pos, B_pos, C_pos):
+        for block, positions in zip((REFLECT, OPAQUE, REFRACT), spare):
+            for i in positions:
+                cells[i] = block
+        Output_Grid = board.rows()
+        for positions in spare:
+            for i in positions:
+                cells[i] = OPEN
+        yield Output_Grid
+
+
+def enumerate_chunks(P, A, B, C, L, Grid, n):
+    '''
+    Split the placements of enumerate_solutions into disjoint chunks by
+    the cell of the first block. Searching the chunks in order finds the
+    solutions in the same order as one full search.
+
+    **Returns**
+        chunks: *list
+            Keys for the chunk argument of enumerate_solutions.
+    '''
+    if A + B + C == 0:
+        return [None]
+    reach = Reachability(P, A, B, C, L, Grid)
+    chunks = list(range(len(reach.cells)))
+    if (0, 0, 0) in reach.splits():
+        chunks.append(-1)
+    return chunks
+
+
+def batch_solutions(P, A, B, C, L, Grid, chunk=None, stop=None,
+                    stats=None, checkpoint=None, size=4096):
+    '''
+    Brute force search like enumerate_solutions, but the candidates are
+    checked size at a time with batch_outcome. Needs numpy.
+
+    **Parameters**
+        P, A, B, C, L, Grid:
+            The puzzle, as returned by ReadInbff.
+        chunk: *int, optional
+            Only search the part of the placements given by one of the
+            keys from enumerate_chunks.
+        stop: *callable, optional
+            Polled before every batch. The search gives up once it
+            returns True.
+        stats: *SolveStats, optional
+            Counts the candidates checked and the lasers traced.
+        checkpoint: *Checkpoint, optional
+            As for enumerate_solutions.
+        size: *int
+            Number of candidates checked together.
+
+    **Returns**
+        Output_Grid: *generator
+            Yields every solved grid, in the same order as
+            enumerate_solutions.
+    '''
+    import numpy as np
+
+    if stats is None:
+        stats = SolveStats()
+    n = 0
+    if checkpoint is not None:
+        n = checkpoint.resume((P, A, B, C, L, Grid),
+                              ['enumerate', chunk], stats) or 0
+    with stats.stage('setup'):
+        board = define_grid(Grid)
+        reach = Reachability(P, A, B, C, L, Grid)
+        empty = np.frombuffer(bytes(board.cells), dtype=np.int8)
+    if reach.unreachable:
+        return
+    check = stats.timed(batch_outcome, 'check')
+    placements = itertools.islice(reach.placements(first=chunk), n, None)
+    while True:
+        if stop is not None and stop():
+            if checkpoint is not None:
+                checkpoint.save(n, stats)
+            return
+        if checkpoint is not None and checkpoint.due():
+            checkpoint.save(n, stats)
+        batch = list(itertools.islice(placements, size))
+        if not batch:
+            return
+        stats.candidates += len(batch)
+        n += len(batch)
+        boards = np.tile(empty, (len(batch), 1))
+        # (candidate, cell) of every block, one block type at a time
+        for t, block in enumerate((REFLECT, OPAQUE, REFRACT)):
+            rows = [j for j, placed in enumerate(batch) for i in placed[t]]
+            cols = [i for placed in batch for i in placed[t]]
+            boards[rows, cols] = block
+        solved = check(P, L, boards.reshape(len(batch), board.height,
+                                            board.width), stats)
+        stats.rejected += len(batch) - int(np.count_nonzero(solved))
+        for j in np.flatnonzero(solved):
+            board.cells[:] = boards[j].tobytes()
+            yield from leftover_grids(board, reach, *batch[j])
+
+
+def target_sides(P, board):
+    '''
+    Returns, for every point in P, the indices of the one or two blocks
+    it lies between. A laser can only reach a point by passing through
+    one of these blocks.
+    '''
+    sides = []
+    for x, y in P:
+        if x % 2 == 0:
+            near = [board.block_ahead(x, y, -1, 1),
+                    board.block_ahead(x, y, 1, 1)]
+        else:
+            near = [board.block_ahead(x, y, 1, -1),
+                    board.block_ahead(x, y, 1, 1)]
+        sides.append(tuple(i for i in near if i >= 0))
+    return sides
+
+
+def blocked_point(sides, cells):
+    '''
+    Returns whether a point can not be hit any more, because every
+    block next to it (see target_sides) is an A or B block and a laser
+    can only reach the point through one of them. Much cheaper than
+    tracing, so a board can often be rejected before any laser is.
+
+    **Parameters**
+        sides: *list
+            target_sides of the points, leaving out the points where a
+            laser starts, as those are always hit.
+        cells: *bytearray
+            The cells of the board.
+    '''
+    for near in sides:
+        for i in near:
+            if cells[i] != REFLECT and cells[i] != OPAQUE:
+                break
+        else:
+            return True
+    return False
+
+
+class BacktrackSearch:
+    '''
+    Laser driven backtracking search.
+
+    Blocks are only ever tried on cells that a laser currently runs
+    into. The first such cell is either given a block (A, C, then B) or
+    marked as staying empty, the lasers are traced again and the search
+    goes one level deeper. Once no laser looks at an undecided cell the
+    paths are final: if every point is hit, the blocks that are left go
+    to cells no laser reaches. Every branch is a different board, so
+    each solution is found once and running out of branches proves the
+    puzzle has no solution.
+
+    The branches are always visited in the same order, so the decisions
+    on the current branch (path) are enough to find the way back to it.
+    A Checkpoint saves them, and a search started with resume set to
+    them skips every branch before that one.
+    '''
+
+    def __init__(self, P, A, B, C, L, Grid, stop=None, stats=None,
+                 checkpoint=None, all_boards=False):
+        self.stats = SolveStats() if stats is None else stats
+        self.P = [tuple(pt) for pt in P]
+        self.counts = {REFLECT: A, OPAQUE: B, REFRACT: C}
+        with self.stats.stage('setup'):
+            self.board = define_grid(Grid)
+            self.tracer = Tracer(self.board, L, self.stats)
+        self.open_cells = [i for i, cell in enumerate(self.board.cells)
+                           if cell == OPEN]
+        # cells that were decided to stay empty
+        self.empty = set()
+        # blocks still to place, and open cells still undecided
+        self.left = A + B + C
+        self.free = len(self.open_cells)
+        # points that are hit anyway because a laser starts there
+        self.starts = {(i[0], i[1]) for i in L}
+        self.sides = [near for pt, near in
+                      zip(self.P, target_sides(self.P, self.board))
+                      if pt not in self.starts]
+        # (cell, block) of every decision on the current branch, with OPEN
+        # for a cell that was decided to stay empty
+        self.path = []
+        self.stop = stop
+        self.checkpoint = checkpoint
+        # yield every arrangement of the blocks left at a leaf, not just
+        # the first one
+        self.all_boards = all_boards
+        # path of the branch to carry on from, until it is reached
+        self.resume = None
+        # set once stop returned True, so the search unwinds without
+        # polling it again or moving the checkpoint on
+        self.stopped = False
+        # Time the steps of the search when asked to. The wrappers are
+        # only put in place with timing on, so they cost nothing otherwise.
+        timed = self.stats.timed
+        self.update = timed(self.tracer.update, 'trace')
+        self.dead = timed(self.dead, 'prune')
+        self.next_cell = timed(self.next_cell, 'branch')
+        self.finish = timed(self.finish, 'finish')
+
+    def place(self, i, block):
+        '''
+        Write block into cell i and bring the laser paths up to date.
+        '''
+        self.board.cells[i] = block
+        self.update((i,))
+
+    def decide(self, i, block):
+        '''
+        Put block into cell i, or keep it empty for good if block is OPEN.
+        '''
+        if block == OPEN:
+            self.empty.add(i)
+        else:
+            self.counts[block] -= 1
+            self.left -= 1
+            self.place(i, block)
+        self.free -= 1
+        self.path.append((i, block))
+
+    def undo(self):
+        '''
+        Take back the last decision.
+        '''
+        i, block = self.path.pop()
+        if block == OPEN:
+            self.empty.discard(i)
+        else:
+            self.place(i, OPEN)
+            self.counts[block] += 1
+            self.left += 1
+        self.free += 1
+
+    def children(self, i):
+        '''
+        Make each decision for cell i in turn, undoing it again after the
+        caller has looked below it.
+        '''
+        order = (REFLECT, REFRACT, OPAQUE, OPEN)
+        resume = self.resume
+        depth = len(self.path)
+        if resume is not None and depth < len(resume) and \
+                resume[depth][0] == i and self.path == resume[:depth]:
+            # on the way back to the resumed branch: skip the decisions
+            # that were searched before it
+            order = order[order.index(resume[depth][1]):]
+        for block in order:
+            if block != OPEN and self.counts[block] == 0:
+                continue
+            self.decide(i, block)
+            yield block
+            self.undo()
+
+    def solutions(self, prefix=()):
+        '''
+        Yields every solved grid, in the same format as Grid.
+
+        **Parameters**
+            prefix: *list, optional
+                Decisions from split. Only the branch below them is
+                searched.
+        '''
+        for i, block in prefix:
+            self.decide(i, block)
+        return self.search()
+
+    def split(self, depth):
+        '''
+        Yields the decisions of every live branch depth levels down, in
+        the order search would visit them. Branches that end earlier are
+        yielded as they are.
+        '''
+        if self.dead():
+            return
+        i = None
+        if self.left:
+            i = self.next_cell()
+        if i is None or depth == 0:
+            yield list(self.path)
+            return
+        for block in self.children(i):
+            yield from self.split(depth - 1)
+
+    def dead(self):
+        '''
+        Returns whether the current branch can no longer be solved.
+        '''
+        if self.left > self.free:
+            return True
+        # A point that is not a laser start needs a block next to it
+        # that lets the laser through.
+        return blocked_point(self.sides, self.board.cells)
+
+    def next_cell(self):
+        '''
+        Returns the first undecided cell a laser looks at, or None.
+        '''
+        cells = self.board.cells
+        empty = self.empty
+        for beam in self.tracer.walk():
+            # touched is in step order: the first free cell is at the
+            # earliest step, and only cells of that same step can tie
+            found = None
+            for i, s in beam.touched.items():
+                if found is not None and s > step:
+                    break
+                if cells[i] == OPEN and i not in empty and \
+                        (found is None or i < found):
+                    found, step = i, s
+            if found is not None:
+                return found
+        return None
+
+    def finish(self):
+        '''
+        Place the blocks that are left on cells no laser reaches.
+        Returns the solved grid, or None if there are not enough of them.
+        '''
+        return next(self.leftovers(), None)
+
+    def leftovers(self):
+        '''
+        Yields the solved grid for every distinct way of placing the
+        blocks that are left on cells no laser reaches.
+        '''
+        cells = self.board.cells
+        touched = set()
+        for beam in self.tracer.walk():
+            touched.update(beam.touched)
+        free = [i for i in self.open_cells if cells[i] == OPEN and
+                i not in self.empty and i not in touched]
+        counts = self.counts
+        for placed in multiset_placements(free, counts[REFLECT],
+                                          counts[OPAQUE], counts[REFRACT]):
+            for block, positions in zip((REFLECT, OPAQUE, REFRACT), placed):
+                for i in positions:
+                    cells[i] = block
+            Output_Grid = self.board.rows()
+            for positions in placed:
+                for i in positions:
+                    cells[i] = OPEN
+            yield Output_Grid
+
+    def search(self):
+        '''
+        Yields the solved grids below the current branch.
+        '''
+        self.stats.candidates += 1
+        if self.resume is not None and len(self.path) >= len(self.resume):
+            self.resume = None
+        checkpoint = self.checkpoint
+        if self.stopped:
+            return
+        if self.resume is not None:
+            # Still on the way back down to the resumed branch, which is
+            # further on than any branch above it: neither stop nor save
+            # here, or a resumed search could keep going back to where
+            # it started.
+            pass
+        elif self.stop is not None and self.stop():
+            self.stopped = True
+            if checkpoint is not None:
+                checkpoint.save(self.path, self.stats)
+            return
+        elif checkpoint is not None and checkpoint.due():
+            checkpoint.save(self.path, self.stats)
+        if self.dead():
+            self.stats.rejected += 1
+            return
+        i = None
+        if self.left:
+            i = self.next_cell()
+        if i is None:
+            # The laser paths can not change any more.
+            if self.tracer.all_touched(self.P):
+                if self.all_boards:
+                    yield from self.leftovers()
+                    return
+                Output_Grid = self.finish()
+                if Output_Grid is not None:
+                    yield Output_Grid
+                    return
+            self.stats.rejected += 1
+            return
+        for block in self.children(i):
+            yield from self.search()
+
+
+def backtrack_solutions(P, A, B, C, L, Grid, chunk=None, stop=None,
+                        stats=None, checkpoint=None, all_boards=False):
+    '''
+    Laser driven backtracking search, see BacktrackSearch.
+
+    **Parameters**
+        P, A, B, C, L, Grid:
+            The puzzle, as returned by ReadInbff.
+        chunk: *list, optional
+            Only search the branch given by one of the keys from
+            backtrack_chunks.
+        stop: *callable, optional
+            Polled at every branch. The search gives up once it
+            returns True.
+        stats: *SolveStats, optional
+            Counts the branches that were checked.
+        checkpoint: *Checkpoint, optional
+            Saves the decisions on the current branch now and then, and
+            carries on from the saved branch.
+        all_boards: *bool
+            Also yield the grids that only differ in where the blocks
+            no laser reaches are, so every solved grid is yielded. By
+            default only one of them is.
+
+    **Returns**
+        Output_Grid: *generator
+            Yields every solved grid, in the same format as Grid.
+    '''
+    if Reachability(P, A, B, C, L, Grid).unreachable:
+        # a point no laser can reach, whatever the blocks
+        return iter(())
+    search = BacktrackSearch(P, A, B, C, L, Grid, stop=stop, stats=stats,
+                             checkpoint=checkpoint, all_boards=all_boards)
+    if checkpoint is not None:
+        resume = checkpoint.resume((P, A, B, C, L, Grid),
+                                   ['backtrack', chunk], search.stats)
+        if resume:
+            search.resume = [tuple(i) for i in resume]
+    return search.solutions(chunk or ())
+
+
+def backtrack_chunks(P, A, B, C, L, Grid, n):
+    '''
+    Split the backtracking search into disjoint branches, going deeper
+    until there are at least 4 * n of them. Searching the branches in
+    order finds the solutions in the same order as one full search.
+
+    **Returns**
+        chunks: *list
+            Keys for the chunk argument of backtrack_solutions.
+    '''
+    chunks = [[]]
+    for depth in range(1, 9):
+        deeper = list(BacktrackSearch(P, A, B, C, L, Grid).split(depth))
+        if len(deeper) <= len(chunks):
+            break
+        chunks = deeper
+        if len(chunks) >= 4 * n:
+            break
+    return chunks
+
+
+def anneal_search(P, A, B, C, L, Grid, budget=10.0, seed=None,
+                  restarts=None, steps=None, stop=None, stats=None):
+    '''
+    Anytime local search by simulated annealing, for boards too big to
+    search completely. Starting from a random arrangement of the blocks,
+    it keeps moving a block to an empty cell or swapping two blocks of
+    different types, accepting moves that hit fewer points less and
+    less often as it cools down. Every restart starts again from a new
+    random arrangement. The search is not complete: running out of time
+    says nothing about whether a solution exists.
+
+    **Parameters**
+        P, A, B, C, L, Grid:
+            The puzzle, as returned by ReadInbff.
+        budget: *float
+            Seconds of wall-clock time to search for.
+        seed: *int, optional
+            Seed of the random numbers, so a search can be repeated.
+        restarts: *int, optional
+            Give up after this many restarts, even with time left.
+        steps: *int, optional
+            Moves per restart, 50 per open cell by default.
+        stop: *callable, optional
+            Polled now and then. The search gives up once it returns True.
+        stats: *SolveStats, optional
+            Counts the candidates that were checked.
+
+    **Returns**
+        Output_Grid: *list or None
+            The best grid found, in the same format as Grid, or None if
+            the blocks do not fit on the board.
+        hit: *int
+            The number of points hit on that grid. The grid is a
+            solution if this is len(P).
+    '''
+    if stats is None:
+        stats = SolveStats()
+    deadline = time.perf_counter() + budget
+    rng = random.Random(seed)
+    board = define_grid(Grid)
+    Possible_Pos = [i for i, cell in enumerate(board.cells) if cell == OPEN]
+    blocks = [REFLECT] * A + [OPAQUE] * B + [REFRACT] * C
+    if len(blocks) > len(Possible_Pos):
+        return None, 0
+    if steps is None:
+        steps = 50 * len(Possible_Pos)
+    # Paths reached before are looked up rather than traced again.
+    cache = TraceCache()
+    cells = board.cells
+
+    def score():
+        stats.candidates += 1
+        return grid_coverage(P, L, board, cache)
+
+    best, best_hit = None, -1
+    restart = 0
+    while restarts is None or restart < restarts:
+        restart += 1
+        for i in Possible_Pos:
+            cells[i] = OPEN
+        # positions[n] is the cell of blocks[n], the rest are empty
+        positions = rng.sample(Possible_Pos, len(blocks))
+        taken = set(positions)
+        empty = [i for i in Possible_Pos if i not in taken]
+        for i, block in zip(positions, blocks):
+            cells[i] = block
+        hit = score()
+        if not blocks:
+            # nothing to move, the empty board is the only one
+            return board.rows(), hit
+        for step in range(steps):
+            if hit > best_hit:
+                best, best_hit = board.rows(), hit
+            if best_hit == len(P) or time.perf_counter() > deadline or \
+                    (stop is not None and step % 100 == 0 and stop()):
+                return best, best_hit
+            # cool down from 1 to 0.05 over the restart
+            temperature = 20.0 ** (-step / steps)
+            n = rng.randrange(len(blocks))
+            m = rng.randrange(len(blocks))
+            if empty and (blocks[n] == blocks[m] or rng.random() < 0.5):
+                # move block n to an empty cell
+                k = rng.randrange(len(empty))
+                old, new = positions[n], empty[k]
+                cells[old], cells[new] = OPEN, blocks[n]
+                moved = score()
+                if moved >= hit or \
+                        rng.random() < math.exp((moved - hit) / temperature):
+                    positions[n], empty[k] = new, old
+                    hit = moved
+                else:
+                    cells[old], cells[new] = blocks[n], OPEN
+            elif blocks[n] != blocks[m]:
+                # swap the cells of two blocks of different types
+                i, j = positions[n], positions[m]
+                cells[i], cells[j] = cells[j], cells[i]
+                swapped = score()
+                if swapped >= hit or \
+                        rng.random() < math.exp((swapped - hit) / temperature):
+                    positions[n], positions[m] = j, i
+                    hit = swapped
+                else:
+                    cells[i], cells[j] = cells[j], cells[i]
+        if hit > best_hit:
+            best, best_hit = board.rows(), hit
+        if best_hit == len(P) or time.perf_counter() > deadline:
+            break
+    return best, best_hit
+
+
+def anneal_solutions(P, A, B, C, L, Grid, chunk=None, stop=None,
+                     stats=None, checkpoint=None, budget=None):
+    '''
+    anneal_search as a search engine. Yields the solved grid it finds,
+    if any. Running out of time says nothing about whether a solution
+    exists, so the engine is in INCOMPLETE_ENGINES.
+
+    **Parameters**
+        P, A, B, C, L, Grid:
+            The puzzle, as returned by ReadInbff.
+        chunk: *int, optional
+            Seed of the random numbers, one of the keys from
+            anneal_chunks. Chunks are independent searches, not parts
+            of one.
+        stop: *callable, optional
+            Polled now and then. The search gives up once it returns True.
+        stats: *SolveStats, optional
+            Counts the candidates that were checked.
+        checkpoint: *Checkpoint, optional
+            Ignored, a random search has no position to carry on from.
+        budget: *float, optional
+            Seconds to search for. By default for as long as stop lets
+            it, or 10 seconds without stop.
+
+    **Returns**
+        Output_Grid: *generator
+            Yields the solved grid, if one was found.
+    '''
+    if Reachability(P, A, B, C, L, Grid).unreachable:
+        return
+    if budget is None:
+        budget = 10.0 if stop is None else math.inf
+    grid, hit = anneal_search(P, A, B, C, L, Grid, budget=budget,
+                              seed=chunk, stop=stop, stats=stats)
+    if grid is not None and hit == len(P):
+        yield grid
+
+
+def anneal_chunks(P, A, B, C, L, Grid, n):
+    '''
+    Returns n seeds for anneal_solutions, so every worker of
+    parallel_solve runs its own search.
+    '''
+    return list(range(n))
+
+
+def iter_solutions(puzzle, engine='backtrack', stop=None, stats=None):
+    '''
+    Yields every distinct solved grid of a puzzle, as soon as it is
+    found. A puzzle without a solution yields nothing.
+
+    **Parameters**
+        puzzle: *string or tuple
+            The name of the directory of the desired bfffile, or the
+            puzzle as returned by ReadInbff.
+        engine: *string
+            The search engine to use, one of ENGINES.
+        stop: *callable, optional
+            Polled now and then. The search gives up once it returns True.
+        stats: *SolveStats, optional
+            Counts the candidates that were checked.
+
+    **Returns**
+        Output_Grid: *generator
+            Yields each solved grid once, in the same format as Grid.
+    '''
+    puzzle = load_puzzle(puzzle)
+    if engine == 'backtrack':
+        # By default it only yields one grid per set of laser paths.
+        return backtrack_solutions(*puzzle, stop=stop, stats=stats,
+                                   all_boards=True)
+    return ENGINES[engine](*puzzle, stop=stop, stats=stats)
+
+
+def count_solutions(puzzle, limit=None, engine='backtrack'):
+    '''
+    Count the distinct solved grids of a puzzle.
+
+    **Parameters**
+        puzzle: *string or tuple
+            As for iter_solutions.
+        limit: *int, optional
+            Stop counting after this many. With limit=2 a puzzle has a
+            unique solution if the count is 1, and checking that only
+            costs as much as finding two solutions.
+        engine: *string
+            The search engine to use, one of ENGINES.
+
+    **Returns**
+        count: *int
+            The number of solutions, at most limit. 0 means the puzzle
+            has no solution.
+    '''
+    solutions = itertools.islice(iter_solutions(puzzle, engine), limit)
+    return sum(1 for i in solutions)
+
+
+# Search engines Solve_LAZOR can use, by name.
+ENGINES = {
+    'backtrack': backtrack_solutions,
+    'enumerate': enumerate_solutions,
+    'batch': batch_solutions,
+    'anneal': anneal_solutions,
+}
+
+# Engines that can not tell a puzzle has no solution, only that they
+# found none in time. They need a timeout.
+INCOMPLETE_ENGINES = {'anneal'}
+
+# How each engine splits its search into chunks for parallel_solve.
+CHUNKERS = {
+    'backtrack': backtrack_chunks,
+    'enumerate': enumerate_chunks,
+    'batch': enumerate_chunks,
+    'anneal': anneal_chunks,
+}
+
+# Per process state of the parallel_solve workers.
+_worker = {}
+
+
+def _init_worker(bfffile, engine, limit, timing, deadline=None):
+    '''
+    Runs once in every worker process, so the puzzle is only parsed
+    once per worker and not once per chunk.
+    '''
+    _worker['puzzle'] = load_puzzle(bfffile)
+    _worker['engine'] = ENGINES[engine]
+    _worker['limit'] = limit
+    _worker['timing'] = timing
+    _worker['deadline'] = deadline
+
+
+def _solve_chunk(index, chunk):
+    '''
+    Search one chunk in a worker. Gives up as soon as a chunk before it
+    has found a solution.
+
+    **Returns**
+        index: *int
+            The index of the chunk.
+        Output_Grid: *list or None
+            The first solution in the chunk, if any.
+        finished: *bool
+            False if the chunk was given up before it was searched.
+        stats: *dict
+            The SolveStats of the chunk, from as_dict.
+    '''
+    limit = _worker['limit']
+    deadline = _worker['deadline']
+    stats = SolveStats(_worker['timing'])
+
+    def stop():
+        return limit.value < index or \
+            (deadline is not None and time.time() > deadline)
+
+    solutions = _worker['engine'](*_worker['puzzle'], chunk=chunk, stop=stop,
+                                  stats=stats)
+    Output_Grid = next(solutions, None)
+    if Output_Grid is not None:
+        with limit.get_lock():
+            limit.value = min(limit.value, index)
+        return index, Output_Grid, True, stats.as_dict()
+    return index, None, not stop(), stats.as_dict()
+
+
+def parallel_solve(bfffile, engine='backtrack', jobs=None,
+                   deterministic=True, stats=None, timeout=None):
+    '''
+    Solve a puzzle on a pool of processes. The search is split into
+    disjoint chunks which the workers take in order.
+
+    **Parameters**
+        bfffile: *string or Puzzle
+            The name of the directory of the desired bfffile, or the
+            puzzle itself.
+        engine: *string
+            The search engine to use, one of ENGINES.
+        jobs: *int, optional
+            Number of worker processes, all cores if None or 0.
+        deterministic: *bool
+            If True, return the same solution as the engine run in a
+            single process, whatever the number of workers. Chunks after
+            the first one that found a solution stop at once, the ones
+            before it are searched to the end, or until timeout, when
+            the first solution found is returned. If False, return the first
+            solution any worker finds and stop every worker.
+        stats: *SolveStats, optional
+            Gets the counters of every chunk that reported back.
+        timeout: *float, optional
+            Seconds after which every worker gives up. Needed by the
+            INCOMPLETE_ENGINES, which search until then.
+
+    **Returns**
+        Output_Grid: *list or None
+            The solved grid, or None if the puzzle has no solution (or
+            none was found in time).
+    '''
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    if engine in INCOMPLETE_ENGINES and timeout is None:
+        raise ValueError('the %s engine needs a timeout' % engine)
+    deadline = None if timeout is None else time.time() + timeout
+    jobs = jobs or multiprocessing.cpu_count()
+    chunks = CHUNKERS[engine](*load_puzzle(bfffile), jobs)
+    # Chunks with an index above limit give up. A solution in chunk k
+    # lowers it to k, or below every chunk if any solution will do.
+    limit = multiprocessing.Value('i', len(chunks))
+    found = {}
+    done = set()
+    Output_Grid = None
+    with ProcessPoolExecutor(jobs, initializer=_init_worker,
+                             initargs=(bfffile, engine, limit,
+                                       stats is not None and stats.timing,
+                                       deadline)) as pool:
+        futures = [pool.submit(_solve_chunk, index, chunk)
+                   for index, chunk in enumerate(chunks)]
+        for future in as_completed(futures):
+            index, grid, finished, chunk_stats = future.result()
+            if stats is not None:
+                stats.merge(chunk_stats)
+            if finished:
+                done.add(index)
+            if grid is not None:
+                found[index] = grid
+                if not deterministic:
+                    Output_Grid = grid
+                    break
+            if found:
+                first = min(found)
+                if all(k in done for k in range(first)):
+                    Output_Grid = found[first]
+                    break
+        if Output_Grid is None and found:
+            # Every chunk reported back, so the ones before the first
+            # solution that did not finish ran out of time: take the
+            # first solution that was found.
+            Output_Grid = found[min(found)]
+        # Nothing left to wait for: cancel the chunks that have not
+        # started and let the running ones see the new limit.
+        with limit.get_lock():
+            limit.value = -1
+        for future in futures:
+            future.cancel()
+    return Output_Grid
+
+
+def solve_puzzle(bfffile, engine='backtrack', timeout=None, jobs=1,
+                 cache=None):
+    '''
+    Solve a puzzle quietly and report how it went, for running many
+    puzzles at once.
+
+    **Parameters**
+        bfffile: *string
+            The name of the directory of the desired bfffile.
+        engine: *string
+            The search engine to use, one of ENGINES.
+        timeout: *float, optional
+            Seconds after which the search gives up. Needed by the
+            INCOMPLETE_ENGINES, which search until then.
+        jobs: *int
+            Number of processes to search with, see parallel_solve.
+        cache: *SolutionCache or string, optional
+            Look the solution up here (or in the SolutionCache with this
+            file name) before searching, and store it after.
+
+    **Returns**
+        result: *dict
+            file, status ('solved', 'unsolvable', 'timeout' or 'error'),
+            solution (the solved grid or None), whether it came from
+            the cache, time in seconds, candidates checked and, for
+            errors, the error message. 'error' is only for a file that
+            could not be read (OSError or BffError); any other exception
+            is raised.
+    '''
+    if engine in INCOMPLETE_ENGINES and timeout is None:
+        raise ValueError('the %s engine needs a timeout' % engine)
+    start = time.time()
+    result = {'file': bfffile, 'status': 'error', 'solution': None,
+              'cached': False}
+    stats = SolveStats()
+    stop = None
+    if timeout is not None:
+        deadline = start + timeout
+
+        def stop():
+            return time.time() > deadline
+    try:
+        puzzle = ReadInbff(bfffile)
+        Output_Grid = None
+        if cache is not None:
+            if isinstance(cache, str):
+                cache = SolutionCache(cache)
+            Output_Grid = cache.get(puzzle)
+            result['cached'] = Output_Grid is not None
+        if Output_Grid is not None:
+            pass
+        elif jobs == 1:
+            Output_Grid = next(ENGINES[engine](*puzzle, stop=stop,
+                                               stats=stats), None)
+        else:
+            Output_Grid = parallel_solve(bfffile, engine, jobs, stats=stats,
+                                         timeout=timeout)
+        if Output_Grid is not None and cache is not None and \
+                not result['cached']:
+            cache.put(puzzle, Output_Grid)
+    except (OSError, BffError) as e:
+        # only a file that can not be read; anything else is a bug
+        result['error'] = str(e)
+    else:
+        if Output_Grid is not None:
+            result['status'] = 'solved'
+            result['solution'] = Output_Grid
+        elif stop is not None and stop():
+            result['status'] = 'timeout'
+        else:
+            result['status'] = 'unsolvable'
+    result['time'] = time.time() - start
+    result['candidates'] = stats.candidates
+    return result
+
+
+def write_solution(outfile, Output_Grid):
+    '''
+    Write a solved grid into a text file.
+
+    **Parameters**
+        outfile: *string
+            The text file to write.
+        Output_Grid: *list
+            The solved grid, in the same format as Grid.
+    '''
+    with open(outfile, mode="w") as f:
+        f.write('Solution:\n')
+        f.write('\n')
+        for s in Output_Grid:
+            f.write("%s\n" % s)
+
+
+def Solve_LAZOR(bfffile, engine='backtrack', jobs=1, outfile=None,
+                return_stats=False, callback=None, profile=None,
+                trace_memory=False, checkpoint=None,
+                checkpoint_interval=60.0, cache=None):
+    '''
+    Function for adding all possible block elements to the grid until
+    a grid that solves the puzzle is found.
+
+    **Parameters**
+        bfffile: *string or Puzzle
+            The name of the directory of the desired bfffile, or the
+            puzzle itself.
+        engine: *string
+            The search engine to use, one of ENGINES.
+        jobs: *int
+            Number of processes to search with. With more than one, the
+            search runs through parallel_solve and still returns the
+            same solution.
+        outfile: *string, optional
+            Text file to write the solution grid into. Nothing is
+            written if it is not given.
+        return_stats: *bool
+            Also return the SolveStats of the solve, with every stage
+            timed.
+        callback: *callable, optional
+            Called with the SolveStats (stages timed) when the solve ends.
+        profile: *string, optional
+            Run the solve under cProfile and save the profile to this
+            file, for use with the pstats module.
+        trace_memory: *bool
+            Record the peak memory of the solve and the lines that
+            allocated the most in the SolveStats, using tracemalloc.
+        checkpoint: *string, optional
+            File the search saves its position to every
+            checkpoint_interval seconds. A later solve of the same
+            puzzle with the same file carries on from that position.
+            The file is removed once the search is over. Only with
+            jobs=1.
+        checkpoint_interval: *float
+            Seconds between two saves of the checkpoint.
+        cache: *SolutionCache or string, optional
+            Look the solution up here (or in the SolutionCache with this
+            file name) before searching, and store it after.
+
+    **Returns**
+        Output_Grid: *list or None
+            The grid with A, B, and C placed in positions
+            where o used to be, or None if the puzzle has no solution.
+        stats: *SolveStats
+            Only if return_stats is True.
+    '''
+    start = time.time()
+    stats = SolveStats(timing=return_stats or callback is not None)
+    if checkpoint is not None:
+        if jobs != 1:
+            raise ValueError('checkpoints only work with jobs=1')
+        checkpoint = Checkpoint(checkpoint, checkpoint_interval)
+    if profile is not None:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    if trace_memory:
+        import tracemalloc
+        tracemalloc.start()
+    with stats.stage('parse'):
+        P, A, B, C, L, Grid = load_puzzle(bfffile)
+    print('')
+    print('Initial Grid:')
+    print('')
+    print("\n".join(map(" ".join, Grid)))
+    if isinstance(cache, str):
+        cache = SolutionCache(cache)
+    cached = None
+    if cache is not None:
+        with stats.stage('cache'):
+            cached = cache.get((P, A, B, C, L, Grid))
+    with stats.stage('search'):
+        if cached is not None:
+            print('')
+            print('Found in the solution cache.')
+            Output_Grid = cached
+        elif jobs == 1:
+            Output_Grid = next(ENGINES[engine](P, A, B, C, L, Grid,
+                                               stats=stats,
+                                               checkpoint=checkpoint), None)
+        else:
+            Output_Grid = parallel_solve(bfffile, engine, jobs, stats=stats)
+    if cache is not None and cached is None and Output_Grid is not None:
+        cache.put((P, A, B, C, L, Grid), Output_Grid)
+    if checkpoint is not None:
+        if checkpoint.rejected is not None:
+            print('Ignored the checkpoint %s, %s.' % (checkpoint.filename,
+                                                      checkpoint.rejected))
+        checkpoint.clear()
+    if trace_memory:
+        stats.peak_memory = tracemalloc.get_traced_memory()[1]
+        top = tracemalloc.take_snapshot().statistics('lineno')[:10]
+        stats.top_allocations = [str(i) for i in top]
+        tracemalloc.stop()
+    if profile is not None:
+        profiler.disable()
+        profiler.dump_stats(profile)
+    if Output_Grid is None:
+        print('')
+        print('No solution exists for this puzzle.')
+    else:
+        print('Passed grid_outcome test!')
+        # Print the solution grid in the terminal
+        print('')
+        print('Solution:')
+        print('')
+        print("\n".join(map(" ".join, Output_Grid)))
+        # Write the solution grid into a text file
+        if outfile is not None:
+            write_solution(outfile, Output_Grid)
+    # Print the amount of time this function took to run
+    end = time.time()
+    print('Time Elapsed: ' + str(end - start) + ' seconds')
+    if callback is not None:
+        callback(stats)
+    if return_stats:
+        return Output_Grid, stats
+    return Output_Grid
+
+
+def positive_int(text):
+    '''
+    argparse type for options like --jobs that must be at least 1.
+    '''
+    value = int(text)
+    if value < 1:
+        raise ValueError(text)
+    return value
+
+
+# Exit codes of main for each status of solve_puzzle. 2 is left for the
+# usage errors reported by argparse.
+EXIT_CODES = {'solved': 0, 'unsolvable': 1, 'timeout': 3, 'error': 4}
+
+
+def main(argv=None):
+    '''
+    Command line interface. Solves one .bff file and returns one of
+    EXIT_CODES, so scripts can tell the outcomes apart.
+    '''
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Solve a LAZOR puzzle. Exits with 0 if it was solved, '
+                    '1 if it has no solution, 3 on timeout and 4 if the '
+                    'file could not be read.')
+    parser.add_argument('bfffile', help='the .bff file to solve')
+    parser.add_argument('--timeout', type=float, default=None,
+                        help='seconds to search before giving up')
+    parser.add_argument('--engine', choices=sorted(ENGINES),
+                        default='backtrack', help='search engine')
+    parser.add_argument('--jobs', type=positive_int, default=1,
+                        help='worker processes (default: 1)')
+    parser.add_argument('--output', choices=('text', 'json'), default='text',
+                        help='print the result as text or as one JSON line')
+    parser.add_argument('--no-write', action='store_true',
+                        help='do not write <name>_solution.txt')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='print nothing, only set the exit code')
+    parser.add_argument('--cache', default=None,
+                        help='SQLite file to look solutions up in and '
+                             'store them to')
+    args = parser.parse_args(argv)
+    if args.engine in INCOMPLETE_ENGINES and args.timeout is None:
+        parser.error('--engine %s needs --timeout' % args.engine)
+
+    result = solve_puzzle(args.bfffile, args.engine, args.timeout, args.jobs,
+                          args.cache)
+    if result['status'] == 'solved' and not args.no_write:
+        # Name the solution after the puzzle so solves of different
+        # puzzles do not overwrite each other.
+        write_solution(os.path.splitext(os.path.basename(args.bfffile))[0] +
+                       '_solution.txt', result['solution'])
+    if args.quiet:
+        pass
+    elif args.output == 'json':
+        import json
+        print(json.dumps(result))
+    elif result['status'] == 'solved':
+        print('Solution:')
+        print('')
+        print("\n".join(result['solution']))
+        print('Time Elapsed: ' + str(result['time']) + ' seconds')
+    elif result['status'] == 'unsolvable':
+        print('No solution exists for this puzzle.')
+    elif result['status'] == 'timeout':
+        print('No solution found in %g seconds.' % args.timeout)
+    else:
+        print('Could not solve %s: %s' % (args.bfffile, result['error']))
+    return EXIT_CODES[result['status']]
 
 
 if __name__ == '__main__':
-    # Input desired .bff file name in the terminal
-    bfffile = input('Please Enter the name of the .bff file to be solved: ')
-    bfffile = 'bff_files/' + bfffile
-    solved = Solve_LAZOR(bfffile)
+    import sys
+    sys.exit(main())
@@ -1,5 +1,18 @@
+import contextlib
+import io
+import itertools
+import json
+import os
+import random
 import unittest
 from SolveLAZOR import *
+from BatchLAZOR import find_bff, solve_batch
+from BenchLAZOR import bench_puzzle, bench_scaling, compare, percentile
+from GenerateLAZOR import generate_puzzle, write_bff
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 class bffTest(unittest.TestCase):
@@ -7,55 +20,24 @@ class bffTest(unittest.TestCase):
         '''
         Initialize the known answers here for unittesting
         '''
-        self.bfffile = 'bff_files\\showstopper_4.bff'
-        self.parseddata = [[2, 3]], 3, 3, 0,\
-            [[3, 6, -1, -1]], ['B o o', 'o o o', 'o o o']
+        self.bfffile = os.path.join('bff_files', 'showstopper_4.bff')
+        self.parseddata = Puzzle(((2, 3),), 3, 3, 0,
+                                 ((3, 6, -1, -1),),
+                                 ('B o o', 'o o o', 'o o o'))
         self.reflect = (-1, 1)
         self.opaque = (0, 0)
         self.refract = (-1, 1, 1, 1)
         self.block = (-1, 1)
-        self.define_grid =\
-            [['o', 'o', 'oB', 'B', 'Bx', 'x', 'xo', 'o', 'oo', 'o', 'o'],
-                ['o', 'o', 'oB', 'B', 'Bx', 'x', 'xo', 'o', 'oo', 'o', 'o'],
-                ['o', 'oo', 'oBoo', 'Bo', 'Bxoo', 'xo', 'xooo', 'oo', 'oooo',
-                 'oo', 'o'],
-                ['o', 'o', 'oo', 'o', 'oo', 'o', 'oo', 'o', 'oo', 'o', 'o'],
-                ['o', 'oo', 'ooox', 'ox', 'ooxo', 'oo', 'oooo', 'oo', 'oooo',
-                 'oo', 'o'],
-                ['o', 'o', 'ox', 'x', 'xo', 'o', 'oo', 'o', 'oo', 'o', 'o'],
-                ['o', 'oo', 'oxox', 'xx', 'xoxo', 'oo', 'oooo', 'oo', 'ooox',
-                 'ox', 'o'],
-                ['o', 'o', 'ox', 'x', 'xo', 'o', 'oo', 'o', 'ox', 'x', 'x'],
-                ['o', 'oo', 'oxoo', 'xo', 'xoox', 'ox', 'ooxx', 'ox', 'oxxo',
-                 'xo', 'x'],
-                ['o', 'o', 'oo', 'o', 'ox', 'x', 'xx', 'x', 'xo', 'o', 'o'],
-                ['o', 'oB', 'ooBo', 'oo', 'oxox', 'xx', 'xxxo', 'xo', 'xooo',
-                 'oo', 'o'],
-                ['B', 'B', 'Bo', 'o', 'ox', 'x', 'xo', 'o', 'oo', 'o', 'o'],
-                ['B', 'B', 'Bo', 'o', 'ox', 'x', 'xo', 'o', 'oo', 'o', 'o']]
+        self.define_grid = Board(5, 6, bytearray(b'oBxoo' b'ooooo'
+                                                 b'oxooo' b'oxoox'
+                                                 b'ooxxo' b'Boxoo'))
         self.Grid = ['o B x o o', 'o o o o o', 'o x o o o', 'o x o o x',
                      'o o x x o', 'B o x o o']
-        self.possible_grid =\
-            [['o', 'o', 'oB', 'B', 'Bx', 'x', 'xA', 'A', 'Ao', 'o', 'o'],
-                ['o', 'o', 'oB', 'B', 'Bx', 'x', 'xA', 'A', 'Ao', 'o', 'o'],
-                ['o', 'oo', 'oBoA', 'BA', 'BxAo', 'xo', 'xAoA', 'AA', 'AoAA',
-                    'oA', 'o'],
-                ['o', 'o', 'oA', 'A', 'Ao', 'o', 'oA', 'A', 'AA', 'A', 'A'],
-                ['o', 'oo', 'oAox', 'Ax', 'AoxA', 'oA', 'oAAo', 'Ao', 'AAoo',
-                    'Ao', 'A'],
-                ['o', 'o', 'ox', 'x', 'xA', 'A', 'Ao', 'o', 'oo', 'o', 'o'],
-                ['o', 'oA', 'oxAx', 'xx', 'xAxo', 'Ao', 'AooA', 'oA', 'ooAx',
-                    'ox', 'o'],
-                ['A', 'A', 'Ax', 'x', 'xo', 'o', 'oA', 'A', 'Ax', 'x', 'x'],
-                ['A', 'Ao', 'Axoo', 'xo', 'xoox', 'ox', 'oAxx', 'Ax', 'Axxo',
-                    'xo', 'x'],
-                ['o', 'o', 'oo', 'o', 'ox', 'x', 'xx', 'x', 'xo', 'o', 'o'],
-                ['o', 'oB', 'ooBo', 'oo', 'oxox', 'xx', 'xxxA', 'xA', 'xoAo',
-                    'oo', 'o'],
-                ['B', 'B', 'Bo', 'o', 'ox', 'x', 'xA', 'A', 'Ao', 'o', 'o'],
-                ['B', 'B', 'Bo', 'o', 'ox', 'x', 'xA', 'A', 'Ao', 'o', 'o']]
+        self.possible_grid = define_grid(
+            ['o B x A o', 'o A o A A', 'o x A o o', 'A x o A x',
+             'o o x x o', 'B o x A o'])
         self.laser_pos =\
-            [(4, -1), (4, 1), (4, 3), (5, 0), (5, 2), (5, 4), (6, 1), (6, 3)]
+            [(4, 1), (4, 3), (5, 0), (5, 2), (5, 4), (6, 1), (6, 3)]
         self.refract_list = []
         self.result_sort =\
             [(4, 1), (4, 3), (5, 0), (5, 2), (5, 4), (6, 1), (6, 3)]
@@ -74,6 +56,36 @@ class bffTest(unittest.TestCase):
         self.assertEqual(ReadInbff(self.bfffile), self.parseddata,
                          'The file data was not parsed correctly.')
 
+    def test_parse_bff(self):
+        '''
+        Checks to make sure that the parser keeps negative numbers and
+        comments after the data, and reports bad lines with their line
+        number.
+        '''
+        puzzle = parse_bff(['GRID START', 'o  o # two open cells',
+                            'GRID STOP', 'A 1', 'L 0 1 1 -1', 'P -1 2'])
+        self.assertEqual(puzzle, (((-1, 2),), 1, 0, 0, ((0, 1, 1, -1),),
+                                  ('o o',)))
+        self.assertEqual(hash(puzzle), hash(parse_bff(
+            ['GRID START', 'o o', 'GRID STOP', 'L 0 1 1 -1', 'A 1',
+             'P -1 2'])))
+        self.assertEqual(define_grid(puzzle), Board(2, 1, bytearray(b'oo')))
+        bad = {'GRID START\no o\no\nGRID STOP': 'x.bff:3: row of 1 cells',
+               'GRID START\no y\nGRID STOP': "x.bff:2: unknown grid cell 'y'",
+               'GRID START\no\nGRID STOP\nL 1 2 1': 'x.bff:4: expected 4',
+               'GRID START\no\nGRID STOP\nA two': 'x.bff:4: not a whole',
+               'GRID START\no\nGRID STOP\nD 1': "x.bff:4: unknown line",
+               'GRID START\no': 'x.bff:2: GRID START without GRID STOP',
+               'A 1\nL 0 1 1 1': 'x.bff: no grid'}
+        for text, message in bad.items():
+            with self.assertRaises(BffError) as cm:
+                parse_bff(text.splitlines(), 'x.bff')
+            self.assertTrue(str(cm.exception).startswith(message),
+                            str(cm.exception))
+        files = find_bff('bff_files')
+        self.assertEqual([name for name, puzzle in iter_puzzles(files)],
+                         files)
+
     def test_Check_Reflect(self):
         '''
         Checks to make sure that the reflect block outputs the
@@ -115,13 +127,31 @@ class bffTest(unittest.TestCase):
         '''
         self.assertEqual(define_grid(self.Grid), self.define_grid,
                          'The grid coordinates were not generated correctly.')
+        self.assertEqual(define_grid(self.Grid).rows(), self.Grid)
+
+    def test_block_ahead(self):
+        '''
+        Checks to make sure that the block in front of a laser is found
+        from either kind of side, and that the grid edges are respected.
+        '''
+        board = define_grid(self.Grid)
+        # left/right side: the block is beside the laser
+        self.assertEqual(board.block_ahead(2, 1, 1, 1), board.index(0, 1))
+        self.assertEqual(board.block_ahead(2, 1, -1, 1), board.index(0, 0))
+        # top/bottom side: the block is above or below the laser
+        self.assertEqual(board.block_ahead(1, 2, 1, -1), board.index(0, 0))
+        self.assertEqual(board.block_ahead(1, 2, 1, 1), board.index(1, 0))
+        # about to leave the grid
+        self.assertEqual(board.block_ahead(0, 1, -1, 1), -1)
+        self.assertEqual(board.block_ahead(1, 12, 1, 1), -1)
 
     def test_Solve_LAZOR(self):
         '''
         Checks to makes sure that a random grid is ouputted.
         '''
         P, A, B, C, L, Grid = self.parseddata
-        self.assertTrue(Solve_LAZOR('bff_files\\yarn_5.bff') ==
+        yarn = os.path.join('bff_files', 'yarn_5.bff')
+        self.assertTrue(Solve_LAZOR(yarn) ==
                         self.sol_grid, 'The incorrect grid was outputted')
 
     def test_grid_outcome(self):
@@ -131,21 +161,636 @@ class bffTest(unittest.TestCase):
         self.assertTrue(grid_outcome(self.P, self.L,
                                      define_grid(self.sol_grid)),
                         'The incorrect grid outcome was outputted')
+        # points off the grid are never hit, rather than standing for
+        # a point on it
+        board = define_grid(['o o', 'o o'])
+        self.assertTrue(grid_outcome([(0, 1)], [(0, 1, 1, 1)], board))
+        self.assertFalse(grid_outcome([(5, 0)], [(0, 1, 1, 1)], board))
+        self.assertFalse(grid_outcome([(-1, 0)], [(0, 1, 1, 1)], board))
+        self.assertEqual(grid_coverage([(0, 1), (-1, 0)], [(0, 1, 1, 1)],
+                                       board), 1)
+
+    def test_Outcome(self):
+        '''
+        Checks to make sure that the prepared outcome agrees with
+        grid_outcome and rejects a board with a walled in point before
+        tracing it
+        '''
+        outcome = Outcome(self.P, 8, 0, 0, self.L, self.Grid)
+        cache = TraceCache()
+        self.assertTrue(outcome(define_grid(self.sol_grid), cache))
+        self.assertFalse(outcome(define_grid(self.Grid), cache))
+        self.assertEqual(outcome.stats.rejected, 1)
+        walled = define_grid(self.sol_grid)
+        for i in target_sides([self.P[0]], walled)[0]:
+            walled.cells[i] = OPAQUE
+        misses = cache.info()['misses']
+        self.assertFalse(outcome(walled, cache))
+        self.assertFalse(grid_outcome(self.P, self.L, walled))
+        self.assertEqual(cache.info()['misses'], misses)
+        self.assertEqual(outcome.stats.rejected, 2)
+        # after the first laser (6, 3) is hit, but (1, 4) is missing and
+        # out of reach of the second laser, so that one is not traced
+        P = [(6, 3), (1, 4), (10, 3)]
+        L = [(4, 1, 1, 1), (9, 2, 1, 1)]
+        outcome = Outcome(P, 8, 0, 0, L, self.Grid)
+        cache = TraceCache()
+        self.assertFalse(outcome(define_grid(self.Grid), cache))
+        self.assertEqual(cache.info()['misses'], 1)
+        self.assertEqual(outcome.stats.rejected, 1)
+
+    def test_enumerate_rejected(self):
+        '''
+        Checks to make sure that every candidate of the enumerate engine
+        that is not a solution is counted as rejected
+        '''
+        stats = SolveStats()
+        solutions = list(enumerate_solutions(*ReadInbff(self.bfffile),
+                                             stats=stats))
+        self.assertEqual(stats.rejected, stats.candidates - len(solutions))
 
     def test_get_all_paths_taken(self):
         '''Checks to make sure that get_all_paths_taken returns all
         of the correct paths taken by the laser'''
         self.assertEqual(get_all_paths_taken(self.L, self.possible_grid),
-                         self.result_sort)
+                         set(self.result_sort))
 
     def test_path_loop(self):
         '''Checks to make sure that path_loop returns the correct laser
         positions and the correct unused refract list that arises from
         hitting a C block'''
         a, b = path_loop(self.L, self.possible_grid)
-        self.assertEqual(a, self.laser_pos)
+        self.assertEqual(a, set(self.laser_pos))
         self.assertEqual(b, self.refract_list)
 
+    def test_multiset_placements(self):
+        '''Checks to make sure that every distinct arrangement of the
+        blocks is generated exactly once'''
+        cells = [(0, 0), (0, 1), (1, 0), (1, 1), (2, 0)]
+        placements = list(multiset_placements(cells, 2, 1, 1))
+        # 5! / (2! * 1! * 1! * 1!) distinct boards
+        self.assertEqual(len(placements), 60)
+        self.assertEqual(len(set(placements)), 60)
+        self.assertEqual(list(multiset_placements(cells, 4, 2, 0)), [])
+
+    def test_Reachability(self):
+        '''
+        Checks to make sure that cells no laser can reach share a bucket
+        and that a point no laser can reach fails the puzzle at once
+        '''
+        grid = ['o o o', 'o o o', 'x x x', 'o o o']
+        laser = [[0, 3, 1, -1]]
+        reach = Reachability([[3, 0]], 1, 0, 0, laser, grid)
+        self.assertEqual(reach.cells, [0, 1, 3, 4, 11])
+        self.assertEqual(reach.bucket, [2, 5, 9, 10])
+        self.assertEqual((reach.space, reach.reduced), (9, 6))
+        self.assertEqual(reach.shrink, 1.5)
+        stats = SolveStats()
+        self.assertEqual(len(list(enumerate_solutions(
+            [[3, 0]], 1, 0, 0, laser, grid, stats=stats))), 6)
+        self.assertEqual(stats.candidates, reach.reduced)
+        reach = Reachability([[3, 8]], 1, 0, 0, laser, grid)
+        self.assertEqual(reach.unreachable, [(3, 8)])
+        for engine in ENGINES.values():
+            stats = SolveStats()
+            self.assertEqual(list(engine([[3, 8]], 1, 0, 0, laser, grid,
+                                         stats=stats)), [])
+            self.assertEqual(stats.candidates, 0)
+
+    def test_FailedTraces(self):
+        '''
+        Checks to make sure that a candidate is only skipped when the
+        cells a failed trace looked at hold the same blocks, and that
+        the trie is started again once it is full
+        '''
+        board = define_grid(self.Grid)
+        tracer = Tracer(board, self.L)
+        looked = tracer.looked()
+        self.assertEqual(looked[0], board.index(1, 2))
+        failed = FailedTraces(max_nodes=len(looked) + 2)
+        failed.add(looked, board.cells)
+        empty = bytearray(board.cells)
+        self.assertTrue(failed.known(empty))
+        other = bytearray(empty)
+        other[looked[-1]] = REFLECT
+        self.assertFalse(failed.known(other))
+        unseen = board.index(5, 4)
+        self.assertNotIn(unseen, looked)
+        other = bytearray(empty)
+        other[unseen] = OPAQUE
+        self.assertTrue(failed.known(other))
+        board.cells[looked[-1]] = REFLECT
+        tracer.update([looked[-1]])
+        failed.add(tracer.looked(), board.cells)
+        self.assertEqual(failed.clears, 1)
+        self.assertFalse(failed.known(empty))
+        # the cells are listed into the same list every time
+        first = tracer.looked()[0]
+        self.assertIs(tracer.looked(), looked)
+        keep = bytearray(len(board.cells))
+        keep[first] = 1
+        self.assertEqual(tracer.looked(keep), [first])
+        stats = SolveStats()
+        puzzle = ReadInbff(os.path.join('bff_files', 'mad_1.bff'))
+        self.assertEqual(list(enumerate_solutions(*puzzle, stats=stats)),
+                         list(iter_solutions(puzzle)))
+        self.assertGreater(stats.skipped, stats.candidates // 2)
+
+    def test_Tracer_update(self):
+        '''Checks to make sure that re-tracing only the changed paths
+        gives the same points as tracing the board from scratch, in the
+        same containers'''
+        board = define_grid(['o o o', 'o o o', 'o o o'])
+        L = [[4, 5, -1, -1]]
+        tracer = Tracer(board, L)
+        beam = tracer.beams[0]
+        containers = (beam.states, beam.touched, beam.spawns)
+        for r, c, block in [(0, 0, REFLECT), (2, 1, REFRACT),
+                            (0, 2, REFLECT), (2, 1, OPEN), (0, 0, OPEN)]:
+            board.cells[board.index(r, c)] = block
+            tracer.update([board.index(r, c)])
+            fresh = Tracer(board.copy(), L)
+            self.assertEqual({p for p, n in tracer.hits.items() if n},
+                             {p for p, n in fresh.hits.items() if n})
+            self.assertEqual(beam.touched, fresh.beams[0].touched)
+        for old, new in zip(containers, (beam.states, beam.touched,
+                                         beam.spawns)):
+            self.assertIs(old, new)
+        self.assertTrue(tracer.all_touched([[4, 5], [1, 2]]))
+
+    def test_Tracer_shared_beams(self):
+        '''Checks to make sure that extra lasers split off in the same
+        state by many C blocks are traced once, and that the shared paths
+        stay right when blocks change'''
+        board = define_grid(['C C C C C'] * 4 + ['o o C C C'])
+        L = [(0, 1, 1, 1)]
+        stats = SolveStats()
+        tracer = Tracer(board, L, stats)
+        self.assertLess(stats.beams, 100)
+        self.assertEqual({p for p, n in tracer.hits.items() if n},
+                         trace_all(L, board))
+        for r, c, block in [(0, 0, OPEN), (2, 2, REFLECT), (0, 0, REFRACT),
+                            (4, 0, REFRACT), (2, 2, REFRACT)]:
+            board.cells[board.index(r, c)] = block
+            tracer.update([board.index(r, c)])
+            self.assertEqual({p for p, n in tracer.hits.items() if n},
+                             trace_all(L, board))
+            # nothing kept that the laser no longer leads to
+            self.assertEqual(len(list(tracer.walk())), len(tracer.starts))
+
+    def test_backtrack_solutions(self):
+        '''Checks to make sure that the backtracking search finds the
+        same solution as trying every board, and that it reports a
+        puzzle with no solution'''
+        P, A, B, C, L, Grid = ReadInbff(self.bfffile)
+        self.assertEqual(list(backtrack_solutions(P, A, B, C, L, Grid)),
+                         list(enumerate_solutions(P, A, B, C, L, Grid)))
+        # no blocks to turn the laser towards (2, 1)
+        self.assertEqual(list(backtrack_solutions([[2, 1]], 0, 0, 0,
+                                                  L, Grid)), [])
+        # (1, 0) is on the top side of the fixed B block
+        self.assertEqual(list(backtrack_solutions([[1, 0]], A, B, C,
+                                                  L, Grid)), [])
+
+    def test_chunks(self):
+        '''Checks to make sure that searching the chunks one after the
+        other finds the same solutions, in the same order, as one
+        full search'''
+        puzzle = ReadInbff(os.path.join('bff_files', 'tiny_5.bff'))
+        for engine in ENGINES:
+            if engine == 'batch' and numpy is None or \
+                    engine in INCOMPLETE_ENGINES:
+                # the chunks of a random search are independent runs
+                continue
+            chunks = CHUNKERS[engine](*puzzle, 4)
+            self.assertGreater(len(chunks), 1)
+            split = [grid for chunk in chunks
+                     for grid in ENGINES[engine](*puzzle, chunk=chunk)]
+            self.assertEqual(split, list(ENGINES[engine](*puzzle)))
+
+    def test_parallel_solve(self):
+        '''Checks to make sure that the parallel search returns the same
+        solution as the search in one process'''
+        puzzle = ReadInbff(self.bfffile)
+        self.assertEqual(parallel_solve(self.bfffile, jobs=2),
+                         next(backtrack_solutions(*puzzle)))
+
+    def test_solve_puzzle(self):
+        '''Checks to make sure that a quiet solve reports the solution,
+        a time out and a missing or broken file, and does not hide
+        other errors'''
+        result = solve_puzzle(self.bfffile)
+        self.assertEqual(result['status'], 'solved')
+        self.assertEqual(result['solution'], ['B A B', 'B o A', 'A o B'])
+        self.assertGreater(result['candidates'], 0)
+        yarn = os.path.join('bff_files', 'yarn_5.bff')
+        self.assertEqual(solve_puzzle(yarn, 'enumerate', 0)['status'],
+                         'timeout')
+        self.assertEqual(solve_puzzle('missing.bff')['status'], 'error')
+        bad = 'test_bad.bff'
+        self.addCleanup(os.remove, bad)
+        with open(bad, 'w') as f:
+            f.write('GRID START\nGRID STOP\n')
+        self.assertEqual(solve_puzzle(bad)['status'], 'error')
+        with self.assertRaises(KeyError):
+            solve_puzzle(self.bfffile, 'no such engine')
+
+    def test_main(self):
+        '''Checks to make sure that the command line tells solved,
+        unsolvable, timed out and unreadable puzzles apart by exit code'''
+        unsolvable = 'test_unsolvable.bff'
+        self.addCleanup(os.remove, unsolvable)
+        with open(os.path.join('bff_files', 'tiny_5.bff')) as f:
+            text = f.read()
+        with open(unsolvable, 'w') as f:
+            # (0, 0) is a corner of a block, which no laser passes
+            f.write(text + '\nP 0 0\n')
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertEqual(main([self.bfffile, '--no-write',
+                                   '--output', 'json']), 0)
+            self.assertEqual(main([unsolvable, '-q']), 1)
+            self.assertEqual(main([os.path.join('bff_files', 'yarn_5.bff'),
+                                   '--engine', 'enumerate', '--timeout', '0',
+                                   '-q']), 3)
+            self.assertEqual(main(['missing.bff', '-q']), 4)
+        with contextlib.redirect_stderr(io.StringIO()):
+            with self.assertRaises(SystemExit) as raised:
+                main([self.bfffile, '--jobs', '0'])
+        self.assertEqual(raised.exception.code, 2)
+        with contextlib.redirect_stderr(io.StringIO()):
+            with self.assertRaises(SystemExit) as raised:
+                main([self.bfffile, '--engine', 'anneal'])
+        self.assertEqual(raised.exception.code, 2)
+        result = json.loads(output.getvalue())
+        self.assertEqual(result['solution'], ['B A B', 'B o A', 'A o B'])
+
+    def test_iter_solutions(self):
+        '''Checks to make sure that every distinct solved grid is found
+        once, including the ones that only differ in where a block no
+        laser reaches is, and that the count can stop early'''
+        puzzle = ([[1, 2]], 0, 1, 0, [[0, 1, 1, 1]], ['o o o', 'o o o'])
+        solutions = list(iter_solutions(puzzle))
+        self.assertEqual(len(solutions), 5)
+        self.assertEqual(sorted(solutions),
+                         sorted(iter_solutions(puzzle, 'enumerate')))
+        self.assertIn(['o o B', 'o o o'], solutions)
+        self.assertEqual(count_solutions(puzzle), 5)
+        self.assertEqual(count_solutions(puzzle, limit=2), 2)
+        self.assertEqual(count_solutions(self.bfffile, limit=2), 1)
+        unsolvable = ([[0, 0]],) + puzzle[1:]
+        self.assertEqual(count_solutions(unsolvable), 0)
+
+    def test_SolutionCache(self):
+        '''Checks to make sure that cached solutions are found again
+        whatever the spacing and comments of the file, that wrong ones
+        are dropped, and that the cache keeps to its size'''
+        filename = 'test_cache.db'
+        self.addCleanup(lambda: os.path.exists(filename) and
+                        os.remove(filename))
+        respaced = 'test_respaced.bff'
+        self.addCleanup(os.remove, respaced)
+        with open(self.bfffile) as f:
+            text = f.read()
+        with open(respaced, 'w') as f:
+            f.write('# the same puzzle\n' +
+                    text.replace('\nL', '\n\n# laser\nL  '))
+        first = solve_puzzle(self.bfffile, cache=filename)
+        self.assertFalse(first['cached'])
+        again = solve_puzzle(respaced, cache=filename)
+        self.assertTrue(again['cached'])
+        self.assertEqual(again['solution'], first['solution'])
+        cache = SolutionCache(filename, max_entries=1)
+        puzzle = ReadInbff(self.bfffile)
+        cache.put(puzzle, ['B A B', 'B o A', 'A B o'])
+        self.assertIsNone(cache.get(puzzle))
+        self.assertEqual(len(cache), 0)
+        for name in ('tiny_5.bff', 'mad_1.bff'):
+            solve_puzzle(os.path.join('bff_files', name), cache=cache)
+        self.assertEqual(len(cache), 1)
+        self.assertTrue(solve_puzzle(os.path.join('bff_files', 'mad_1.bff'),
+                                     cache=cache)['cached'])
+
+    def test_solve_batch(self):
+        '''Checks to make sure that the batch solver solves every
+        bundled puzzle, and reports a puzzle that fails as an error
+        without stopping'''
+        files = find_bff('bff_files')
+        self.assertEqual(len(files), 8)
+        results = list(solve_batch('bff_files', jobs=2, timeout=60))
+        self.assertEqual(sorted(i['file'] for i in results), files)
+        self.assertTrue(all(i['status'] == 'solved' for i in results))
+        # solve_puzzle raises for an engine that needs a timeout; every
+        # puzzle still gets its line
+        results = list(solve_batch('bff_files', jobs=2, engine='anneal'))
+        self.assertEqual(sorted(i['file'] for i in results), files)
+        self.assertTrue(all(i['status'] == 'error' and
+                            i['error'].startswith('ValueError')
+                            for i in results))
+
+    def test_bench(self):
+        '''Checks to make sure that the benchmark records its timings,
+        times generated puzzles by size and flags a puzzle or size that
+        got slower than the baseline'''
+        self.assertEqual(percentile([5, 1, 4, 2, 3], 95), 5)
+        self.assertEqual(percentile([5, 1, 4, 2, 3], 50), 3)
+        result = bench_puzzle(self.bfffile, rounds=2)
+        self.assertLessEqual(result['median'], result['p95'])
+        self.assertGreater(result['peak_kib'], 0)
+        self.assertIn('rejected_per_us', result)
+        baseline = {'puzzles': {'a.bff': {'median': 0.1, 'p95': 0.2}}}
+        slower = {'puzzles': {'a.bff': {'median': 0.3, 'p95': 0.25}}}
+        self.assertEqual(compare(slower, baseline, threshold=1.5),
+                         [('a.bff', 'median', 0.1, 0.3)])
+        self.assertEqual(compare(baseline, baseline), [])
+        curve = bench_scaling([3, 4], count=2)
+        self.assertEqual(sorted(curve), ['3', '4'])
+        self.assertEqual(curve['4']['timeouts'], 0)
+        self.assertEqual(compare({'scaling': {'4': {'median': 0.3}}},
+                                 {'scaling': {'4': {'median': 0.1}}}),
+                         [('4x4', 'median', 0.1, 0.3)])
+
+    def test_generate_puzzle(self):
+        '''Checks to make sure that generated puzzles are the same for the
+        same seed, can be read back and are solved by their solution'''
+        puzzle, solution = generate_puzzle(6, 6, A=3, B=1, C=1, lasers=2,
+                                           targets=4, seed=3)
+        self.assertEqual(generate_puzzle(6, 6, A=3, B=1, C=1, lasers=2,
+                                         targets=4, seed=3),
+                         (puzzle, solution))
+        self.assertEqual((len(puzzle.P), len(puzzle.L)), (4, 2))
+        self.assertTrue(check_solution(*puzzle, solution))
+        filename = 'test_generated.bff'
+        self.addCleanup(os.remove, filename)
+        write_bff(filename, puzzle, 'seed 3')
+        self.assertEqual(ReadInbff(filename), puzzle)
+        with self.assertRaises(ValueError):
+            generate_puzzle(2, 2, A=5)
+        # the points are picked from the paths of every laser, not just
+        # the first one
+        later = 0
+        for seed in range(10):
+            puzzle, solution = generate_puzzle(6, 6, A=3, B=1, C=1,
+                                               lasers=3, targets=4,
+                                               seed=seed)
+            first = trace_all(puzzle.L[:1], define_grid(solution))
+            later += any(pt not in first for pt in puzzle.P)
+        self.assertGreater(later, 0)
+
+    def test_solve_stats(self):
+        '''Checks to make sure that Solve_LAZOR counts and times the
+        stages of a solve and hands the stats to the callback'''
+        seen = []
+        grid, stats = Solve_LAZOR(os.path.join('bff_files', 'tiny_5.bff'),
+                                  return_stats=True, callback=seen.append)
+        self.assertEqual(grid, ['A B A', 'o o o', 'A C o'])
+        self.assertEqual(seen, [stats])
+        self.assertGreater(stats.candidates, 0)
+        self.assertGreater(stats.steps, 0)
+        # the C block splits the laser in two
+        self.assertGreaterEqual(stats.splits, 1)
+        self.assertGreater(stats.beams, stats.splits)
+        for stage in ('parse', 'setup', 'trace', 'search'):
+            self.assertIn(stage, stats.times)
+        # without timing only the counters are kept
+        stats = SolveStats()
+        next(backtrack_solutions(*ReadInbff(self.bfffile), stats=stats))
+        self.assertEqual(stats.times, {})
+        self.assertGreater(stats.candidates, 0)
+
+    def test_path_loop_cycle(self):
+        '''Checks to make sure that a laser trapped in a ring of A blocks
+        stops once it goes round the same loop again'''
+        ring = define_grid(['A A A', 'A o A', 'A A A'])
+        a, b = path_loop([[2, 3, 1, -1]], ring)
+        self.assertEqual(a, {(2, 3), (3, 2), (4, 3), (3, 4)})
+        a, b = path_loop([[2, 3, 1, -1]], ring, max_steps=2)
+        self.assertEqual(a, {(2, 3), (3, 2)})
+        tracer = Tracer(ring, [[2, 3, 1, -1]])
+        self.assertEqual(len(tracer.beams[0].states), 5)
+
+    def test_trace_all(self):
+        '''Checks to make sure that every extra laser split off by the
+        C blocks is traced, including the second split of one pass'''
+        board = define_grid(['o o o', 'C o o', 'C o o'])
+        covered = get_all_paths_taken([[0, 5, 1, -1]], board)
+        # reached only by the laser split off by the upper C block
+        self.assertIn((2, 5), covered)
+        self.assertIn((3, 6), covered)
+        self.assertEqual(trace_all([[0, 5, 1, -1], [2, 5, 1, 1]], board),
+                         covered)
+
+    def test_FlightTable(self):
+        '''Checks to make sure that lasers jump over the 'x' cells to the
+        next cell that could hold a block, and that copies of a board
+        share the table'''
+        board = define_grid(['x x x', 'x x o', 'x x x'])
+        table = board.flight_table()
+        # straight across the x cells to the open cell
+        self.assertEqual(table.jumps[(2, 1, 1, 1)],
+                         (((3, 2, 1, 1), (4, 3, 1, 1)), (4, 3, 1, 1),
+                          board.target_mask([(3, 2), (4, 3)])))
+        # straight out of the grid
+        self.assertEqual(table.jumps[(0, 5, 1, 1)][1], None)
+        # in front of the open cell there is nothing to jump
+        self.assertNotIn((4, 3, 1, 1), table.jumps)
+        self.assertIs(board.copy().flight_table(), table)
+        board.cells[board.index(1, 2)] = REFLECT
+        self.assertEqual(path_loop([[2, 1, 1, 1]], board)[0],
+                         {(2, 1), (3, 2), (4, 3), (3, 4), (2, 5), (1, 6)})
+
+    def test_trace_mask(self):
+        '''Checks to make sure that the coverage mask holds the same
+        points as trace_all, and that tracing stops once every target
+        is hit'''
+        board = define_grid(self.sol_grid)
+        covered = trace_all(self.L, board)
+        self.assertEqual(trace_mask(self.L, board), board.target_mask(covered))
+        self.assertEqual(board.bit(1, 0) | board.bit(0, 1),
+                         board.target_mask([(1, 0), (0, 1)]))
+        first = board.target_mask([tuple(self.L[0][:2])])
+        early = trace_mask(self.L, board, first)
+        self.assertEqual(early & first, first)
+        self.assertLess(bin(early).count('1'), len(covered))
+        self.assertEqual(trace_mask(self.L, board, cache=TraceCache()),
+                         trace_mask(self.L, board))
+
+    @unittest.skipUnless(numpy, 'needs numpy')
+    def test_batch_outcome(self):
+        '''Checks to make sure that checking boards in a batch agrees
+        with grid_outcome on random candidates of every bundled puzzle'''
+        rng = random.Random(0)
+        for bfffile in find_bff('bff_files'):
+            P, A, B, C, L, Grid = ReadInbff(bfffile)
+            board = define_grid(Grid)
+            cells = [i for i, cell in enumerate(board.cells) if cell == OPEN]
+            placements = list(itertools.islice(
+                multiset_placements(cells, A, B, C), 2000))
+            placements = rng.sample(placements, min(200, len(placements)))
+            boards = []
+            expected = []
+            for placed in placements:
+                candidate = board.copy()
+                for block, positions in zip((REFLECT, OPAQUE, REFRACT),
+                                            placed):
+                    for i in positions:
+                        candidate.cells[i] = block
+                boards.append(list(candidate.cells))
+                expected.append(grid_outcome(P, L, candidate))
+            solved = define_grid(next(backtrack_solutions(P, A, B, C, L,
+                                                          Grid)))
+            boards.append(list(solved.cells))
+            expected.append(True)
+            boards = numpy.array(boards, dtype=numpy.int8).reshape(
+                len(boards), board.height, board.width)
+            self.assertEqual(list(batch_outcome(P, L, boards)), expected)
+        # a point listed twice only needs to be hit once
+        solved = define_grid(self.sol_grid)
+        boards = numpy.array([list(solved.cells)], dtype=numpy.int8).reshape(
+            1, solved.height, solved.width)
+        self.assertTrue(batch_outcome(self.P + [self.P[0]], self.L,
+                                      boards)[0])
+        stats = SolveStats()
+        self.assertTrue(batch_outcome(self.P, self.L, boards, stats)[0])
+        self.assertEqual(stats.splits, 0)
+        self.assertEqual(stats.beams, len(self.L))
+        self.assertGreater(stats.steps, stats.beams)
+        stats = SolveStats()
+        list(batch_solutions(*ReadInbff(os.path.join('bff_files',
+                                                     'mad_1.bff')),
+                             stats=stats))
+        self.assertGreater(stats.splits, 0)
+        self.assertEqual(stats.beams, stats.candidates + stats.splits)
+
+    def test_anneal_search(self):
+        '''Checks to make sure that the local search finds a solution of
+        a small puzzle, reports partial coverage, and repeats itself for
+        the same seed'''
+        P, A, B, C, L, Grid = ReadInbff(self.bfffile)
+        grid, hit = anneal_search(P, A, B, C, L, Grid, seed=1)
+        self.assertEqual(hit, len(P))
+        self.assertTrue(check_solution(P, A, B, C, L, Grid, grid))
+        for name in ('tiny_5', 'numbered_6', 'mad_1'):
+            puzzle = ReadInbff(os.path.join('bff_files', name + '.bff'))
+            grid, hit = anneal_search(*puzzle, seed=2)
+            self.assertEqual(hit, len(puzzle[0]))
+            self.assertTrue(check_solution(*puzzle, grid))
+        self.assertEqual(grid_coverage(self.P, self.L,
+                                       define_grid(self.Grid)), 0)
+        puzzle = ReadInbff(os.path.join('bff_files', 'mad_7.bff'))
+        runs = [anneal_search(*puzzle, seed=3, restarts=1, steps=200)
+                for n in range(2)]
+        self.assertEqual(runs[0], runs[1])
+        self.assertEqual(runs[0][1], grid_coverage(puzzle[0], puzzle[4],
+                                                   define_grid(runs[0][0])))
+        # without blocks there is one board to score, whatever the budget
+        stats = SolveStats()
+        self.assertEqual(anneal_search(self.P, 0, 0, 0, self.L, self.Grid,
+                                       budget=60, stats=stats),
+                         (self.Grid, 0))
+        self.assertEqual(stats.candidates, 1)
+        result = solve_puzzle(self.bfffile, 'anneal', 10)
+        self.assertEqual(result['status'], 'solved')
+        self.assertTrue(check_solution(P, A, B, C, L, Grid,
+                                       result['solution']))
+        with self.assertRaises(ValueError):
+            solve_puzzle(self.bfffile, 'anneal')
+
+    def test_Checkpoint(self):
+        '''Checks to make sure that a search stopped part way carries on
+        from its checkpoint, and that checkpoints of another puzzle are
+        ignored'''
+        filename = 'test_checkpoint.json'
+        self.addCleanup(lambda: os.path.exists(filename) and
+                        os.remove(filename))
+        puzzle = ReadInbff(os.path.join('bff_files', 'mad_1.bff'))
+        full = SolveStats()
+        expected = list(backtrack_solutions(*puzzle, stats=full))
+        polls = []
+
+        def stop():
+            polls.append(1)
+            return len(polls) > 20
+        self.assertEqual(list(backtrack_solutions(
+            *puzzle, stop=stop, checkpoint=Checkpoint(filename))), [])
+        checkpoint = Checkpoint(filename)
+        stats = SolveStats()
+        self.assertEqual(list(backtrack_solutions(*puzzle, stats=stats,
+                                                  checkpoint=checkpoint)),
+                         expected)
+        self.assertIsNone(checkpoint.rejected)
+        # the counters carry on from the saved ones
+        self.assertGreater(stats.candidates, full.candidates)
+        self.assertLess(stats.candidates, full.candidates + 20)
+        other = ReadInbff(self.bfffile)
+        checkpoint = Checkpoint(filename)
+        self.assertEqual(list(backtrack_solutions(*other,
+                                                  checkpoint=checkpoint)),
+                         list(backtrack_solutions(*other)))
+        self.assertEqual(checkpoint.rejected, 'written for another puzzle')
+        # a search stopped again and again, even before it is back on
+        # the branch it resumed, still gets to the end
+        os.remove(filename)
+        for rounds in range(full.candidates):
+            polls.clear()
+            found = list(backtrack_solutions(
+                *puzzle, stop=lambda: polls.append(1) or len(polls) > 3,
+                checkpoint=Checkpoint(filename)))
+            if found:
+                break
+        self.assertEqual(found, expected[:1])
+
+    @unittest.skipUnless(numpy, 'needs numpy')
+    def test_Checkpoint_batch(self):
+        '''Checks to make sure that the batch engine saves how many
+        candidates it checked, so a resumed search checks each of them
+        once'''
+        filename = 'test_checkpoint.json'
+        self.addCleanup(lambda: os.path.exists(filename) and
+                        os.remove(filename))
+        puzzle = ReadInbff(os.path.join('bff_files', 'mad_1.bff'))
+        full = SolveStats()
+        expected = list(batch_solutions(*puzzle, stats=full, size=50))
+        polls = []
+
+        def stop():
+            polls.append(1)
+            return len(polls) > 2
+        found = list(batch_solutions(*puzzle, stop=stop, size=50,
+                                     checkpoint=Checkpoint(filename)))
+        stats = SolveStats()
+        found += batch_solutions(*puzzle, stats=stats, size=50,
+                                 checkpoint=Checkpoint(filename))
+        self.assertEqual(found, expected)
+        self.assertEqual(stats.candidates, full.candidates)
+
+    def test_TraceCache(self):
+        '''Checks to make sure that cached paths are only reused where
+        the cells they looked at are unchanged, and that the cache stays
+        under its memory limit'''
+        cache = TraceCache()
+        board = define_grid(self.sol_grid)
+        self.assertTrue(grid_outcome(self.P, self.L, board, cache))
+        self.assertEqual(cache.info()['misses'], 1)
+        self.assertTrue(grid_outcome(self.P, self.L, board, cache))
+        self.assertEqual(cache.info()['hits'], 1)
+        # moving a block off the path needs a new trace
+        board.cells[board.index(5, 3)] = OPEN
+        self.assertEqual(get_all_paths_taken(self.L, board, cache=cache),
+                         get_all_paths_taken(self.L, board))
+        self.assertEqual(cache.info()['misses'], 2)
+        # a path cut off by max_steps is not handed out as a whole one
+        empty = define_grid(['o o o'] * 3)
+        self.assertEqual(trace_all([[0, 1, 1, 1]], empty, max_steps=1,
+                                   cache=cache), {(0, 1)})
+        self.assertEqual(trace_all([[0, 1, 1, 1]], empty, cache=cache),
+                         trace_all([[0, 1, 1, 1]], empty))
+        small = TraceCache(max_bytes=1)
+        for grid in (self.sol_grid, self.Grid):
+            trace_all(self.L, define_grid(grid), cache=small)
+        self.assertEqual(small.info()['entries'], 1)
+        self.assertEqual(small.info()['evictions'], 1)
+
 
 if __name__ == '__main__':
     unittest.main()